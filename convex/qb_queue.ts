@@ -169,51 +169,171 @@ export const getNextPendingQbEvent = query({
     },
 });
 
-export const markEventInFlight = mutation({
-    args: {
-        eventId: v.id("inventory_events"),
-        ticket: v.string(),
-    },
-    handler: async (ctx, args) => {
-        const ticket = args.ticket.trim();
-        if (!ticket) {
-            throw new Error("ticket is required.");
-        }
+async function touchSessionInFlight(ctx: any, ticket: string, eventId: any, now: number) {
+    const session = await ctx.db
+        .query("qb_sync_sessions")
+        .withIndex("by_ticket", (q: any) => q.eq("ticket", ticket))
+        .first();
+    if (session) {
+        await ctx.db.patch(session._id, {
+            lastSeenAt: now,
+            inFlightEventId: eventId,
+        });
+    } else {
+        await ctx.db.insert("qb_sync_sessions", {
+            ticket,
+            startedAt: now,
+            lastSeenAt: now,
+            inFlightEventId: eventId,
+        });
+    }
+}
 
-        const event = await ctx.db.get(args.eventId);
-        if (!event) {
-            throw new Error("Event not found.");
-        }
-        if (event.status !== "committed") {
-            throw new Error(`Event ${args.eventId} is not committed.`);
-        }
-        if (event.qbStatus !== "pending" && event.qbStatus !== "in_flight") {
-            throw new Error(`Event ${args.eventId} is not eligible for in-flight transition.`);
+async function markEventInFlightRecord(ctx: any, eventId: any, now: number) {
+    const event = await ctx.db.get(eventId);
+    if (!event) {
+        throw new Error("Event not found.");
+    }
+    if (event.status !== "committed") {
+        throw new Error(`Event ${eventId} is not committed.`);
+    }
+    if (event.qbStatus !== "pending" && event.qbStatus !== "in_flight") {
+        throw new Error(`Event ${eventId} is not eligible for in-flight transition.`);
+    }
+
+    await ctx.db.patch(eventId, {
+        qbStatus: "in_flight",
+        qbLastAttemptAt: now,
+    });
+}
+
+// Stricter than markEventInFlightRecord: an in_flight event can only be
+// re-claimed by the ticket that holds it, so two sessions never both send it.
+async function claimEventRecord(ctx: any, eventId: any, ticket: string, now: number) {
+    const event = await ctx.db.get(eventId);
+    if (!event) {
+        throw new Error("Event not found.");
+    }
+    if (event.status !== "committed") {
+        throw new Error(`Event ${eventId} is not committed.`);
+    }
+    if (event.qbStatus === "in_flight") {
+        const session = await ctx.db
+            .query("qb_sync_sessions")
+            .withIndex("by_ticket", (q: any) => q.eq("ticket", ticket))
+            .first();
+        if (!session || session.inFlightEventId !== eventId) {
+            throw new Error(`Event ${eventId} is in flight for another session.`);
         }
+    } else if (event.qbStatus !== "pending") {
+        throw new Error(`Event ${eventId} is not eligible for in-flight transition.`);
+    }
 
-        const now = Date.now();
-        await ctx.db.patch(args.eventId, {
-            qbStatus: "in_flight",
-            qbLastAttemptAt: now,
-        });
+    await ctx.db.patch(eventId, {
+        qbStatus: "in_flight",
+        qbLastAttemptAt: now,
+    });
+}
+
+const qbResultArgs = {
+    eventId: v.id("inventory_events"),
+    ticket: v.optional(v.string()),
+    success: v.boolean(),
+    qbTxnId: v.optional(v.string()),
+    qbTxnType: v.optional(v.string()),
+    qbErrorCode: v.optional(v.string()),
+    qbErrorMessage: v.optional(v.string()),
+    retryable: v.optional(v.boolean()),
+};
+
+async function applyQbResultRecord(
+    ctx: any,
+    args: {
+        eventId: any;
+        ticket?: string;
+        success: boolean;
+        qbTxnId?: string;
+        qbTxnType?: string;
+        qbErrorCode?: string;
+        qbErrorMessage?: string;
+        retryable?: boolean;
+    },
+) {
+    const event = await ctx.db.get(args.eventId);
+    if (!event) {
+        throw new Error("Event not found.");
+    }
 
+    const now = Date.now();
+    const ticket = args.ticket?.trim();
+    if (ticket) {
         const session = await ctx.db
             .query("qb_sync_sessions")
-            .withIndex("by_ticket", (q) => q.eq("ticket", ticket))
+            .withIndex("by_ticket", (q: any) => q.eq("ticket", ticket))
             .first();
         if (session) {
             await ctx.db.patch(session._id, {
                 lastSeenAt: now,
-                inFlightEventId: args.eventId,
-            });
-        } else {
-            await ctx.db.insert("qb_sync_sessions", {
-                ticket,
-                startedAt: now,
-                lastSeenAt: now,
-                inFlightEventId: args.eventId,
+                lastError: args.success ? undefined : args.qbErrorMessage,
             });
         }
+    }
+
+    if (args.success) {
+        await ctx.db.patch(args.eventId, {
+            qbStatus: "applied",
+            qbTxnId: args.qbTxnId,
+            qbTxnType: args.qbTxnType ?? event.qbTxnType,
+            qbErrorCode: undefined,
+            qbErrorMessage: undefined,
+            qbLastAttemptAt: now,
+        });
+        return {
+            eventId: args.eventId,
+            qbStatus: "applied",
+            retryCount: event.retryCount,
+        };
+    }
+
+    const nextRetryCount = event.retryCount + 1;
+    const requestedRetryable = args.retryable ?? true;
+    const retryable = requestedRetryable && isRetryableQbError(args.qbErrorCode);
+    const shouldRetry = retryable && nextRetryCount < MAX_RETRIES;
+    const retryAt = shouldRetry
+        ? now + getRetryDelaySeconds(nextRetryCount) * 1000
+        : now;
+
+    await ctx.db.patch(args.eventId, {
+        qbStatus: shouldRetry ? "pending" : "error",
+        qbErrorCode: args.qbErrorCode ?? "UNKNOWN",
+        qbErrorMessage: args.qbErrorMessage ?? "QuickBooks sync failed.",
+        retryCount: nextRetryCount,
+        retryAt,
+        qbLastAttemptAt: now,
+    });
+
+    return {
+        eventId: args.eventId,
+        qbStatus: shouldRetry ? "pending" : "error",
+        retryCount: nextRetryCount,
+        retryAt,
+    };
+}
+
+export const markEventInFlight = mutation({
+    args: {
+        eventId: v.id("inventory_events"),
+        ticket: v.string(),
+    },
+    handler: async (ctx, args) => {
+        const ticket = args.ticket.trim();
+        if (!ticket) {
+            throw new Error("ticket is required.");
+        }
+
+        const now = Date.now();
+        await markEventInFlightRecord(ctx, args.eventId, now);
+        await touchSessionInFlight(ctx, ticket, args.eventId, now);
 
         return {
             eventId: args.eventId,
@@ -224,76 +344,89 @@ export const markEventInFlight = mutation({
     },
 });
 
-export const applyQbResult = mutation({
+async function applyQbResultRecords(ctx: any, results: any[], now: number) {
+    const applied: any[] = [];
+    const failed: { eventId: any; error: string }[] = [];
+    for (const result of results) {
+        try {
+            // Batched failures may settle events the middleware never claimed
+            // (nothing to send), so apply the same eligibility check as a claim;
+            // an event already settled elsewhere is not overwritten. Successes
+            // are always recorded: QuickBooks already has the transaction.
+            if (!result.success) {
+                await markEventInFlightRecord(ctx, result.eventId, now);
+            }
+            applied.push(await applyQbResultRecord(ctx, result));
+        } catch (error) {
+            failed.push({
+                eventId: result.eventId,
+                error: error instanceof Error ? error.message : String(error),
+            });
+        }
+    }
+    return { applied, failed };
+}
+
+// Used by the QBWC middleware right before it sends an event: claims that one
+// event and applies the middleware's buffered results in a single round-trip.
+// An ineligible event is reported back instead of failing (and rolling back)
+// the results.
+export const claimEvent = mutation({
     args: {
         eventId: v.id("inventory_events"),
-        ticket: v.optional(v.string()),
-        success: v.boolean(),
-        qbTxnId: v.optional(v.string()),
-        qbTxnType: v.optional(v.string()),
-        qbErrorCode: v.optional(v.string()),
-        qbErrorMessage: v.optional(v.string()),
-        retryable: v.optional(v.boolean()),
+        ticket: v.string(),
+        results: v.array(v.object(qbResultArgs)),
     },
     handler: async (ctx, args) => {
-        const event = await ctx.db.get(args.eventId);
-        if (!event) {
-            throw new Error("Event not found.");
+        const ticket = args.ticket.trim();
+        if (!ticket) {
+            throw new Error("ticket is required.");
         }
 
         const now = Date.now();
-        const ticket = args.ticket?.trim();
-        if (ticket) {
-            const session = await ctx.db
-                .query("qb_sync_sessions")
-                .withIndex("by_ticket", (q) => q.eq("ticket", ticket))
-                .first();
-            if (session) {
-                await ctx.db.patch(session._id, {
-                    lastSeenAt: now,
-                    lastError: args.success ? undefined : args.qbErrorMessage,
-                });
-            }
+        let claimed = true;
+        let error: string | undefined;
+        try {
+            await claimEventRecord(ctx, args.eventId, ticket, now);
+        } catch (claimError) {
+            claimed = false;
+            error = claimError instanceof Error ? claimError.message : String(claimError);
         }
 
-        if (args.success) {
-            await ctx.db.patch(args.eventId, {
-                qbStatus: "applied",
-                qbTxnId: args.qbTxnId,
-                qbTxnType: args.qbTxnType ?? event.qbTxnType,
-                qbErrorCode: undefined,
-                qbErrorMessage: undefined,
-                qbLastAttemptAt: now,
-            });
-            return {
-                eventId: args.eventId,
-                qbStatus: "applied",
-                retryCount: event.retryCount,
-            };
+        const { applied, failed } = await applyQbResultRecords(ctx, args.results, now);
+
+        if (claimed) {
+            await touchSessionInFlight(ctx, ticket, args.eventId, now);
         }
 
-        const nextRetryCount = event.retryCount + 1;
-        const requestedRetryable = args.retryable ?? true;
-        const retryable = requestedRetryable && isRetryableQbError(args.qbErrorCode);
-        const shouldRetry = retryable && nextRetryCount < MAX_RETRIES;
-        const retryAt = shouldRetry
-            ? now + getRetryDelaySeconds(nextRetryCount) * 1000
-            : now;
+        return {
+            eventId: args.eventId,
+            claimed,
+            error,
+            results: applied,
+            failed,
+            ticket,
+            markedAt: now,
+        };
+    },
+});
 
-        await ctx.db.patch(args.eventId, {
-            qbStatus: shouldRetry ? "pending" : "error",
-            qbErrorCode: args.qbErrorCode ?? "UNKNOWN",
-            qbErrorMessage: args.qbErrorMessage ?? "QuickBooks sync failed.",
-            retryCount: nextRetryCount,
-            retryAt,
-            qbLastAttemptAt: now,
-        });
+export const applyQbResult = mutation({
+    args: qbResultArgs,
+    handler: async (ctx, args) => {
+        return await applyQbResultRecord(ctx, args);
+    },
+});
 
+export const applyQbResults = mutation({
+    args: {
+        results: v.array(v.object(qbResultArgs)),
+    },
+    handler: async (ctx, args) => {
+        const { applied, failed } = await applyQbResultRecords(ctx, args.results, Date.now());
         return {
-            eventId: args.eventId,
-            qbStatus: shouldRetry ? "pending" : "error",
-            retryCount: nextRetryCount,
-            retryAt,
+            results: applied,
+            failed,
         };
     },
 });
@@ -6,10 +6,12 @@ This script validates:
 - sendRequestXML -> qbXML payload
 - receiveResponseXML -> Convex apply success
 - getLastError/closeConnection basic behavior
+- batched event fetches never leave unsent events in flight
 """
 
 from __future__ import annotations
 
+import json
 import os
 import sys
 from dataclasses import dataclass, field
@@ -45,6 +47,16 @@ class FakeConvexClient:
         self.in_flight_calls.append({"eventId": event_id, "ticket": ticket})
         return {"eventId": event_id, "ticket": ticket, "qbStatus": "in_flight"}
 
+    def claim_event(
+        self,
+        event_id: str,
+        ticket: str,
+        results: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        self.in_flight_calls.append({"eventId": event_id, "ticket": ticket})
+        applied = self.apply_qb_results(results)
+        return {"eventId": event_id, "claimed": True, "ticket": ticket, **applied}
+
     def apply_qb_result(
         self,
         event_id: str,
@@ -70,6 +82,80 @@ class FakeConvexClient:
         self.apply_calls.append(payload)
         return payload
 
+    def apply_qb_results(self, results: list[dict[str, Any]]) -> dict[str, Any]:
+        for result in results:
+            self.apply_calls.append(
+                {
+                    "eventId": result.get("eventId"),
+                    "ticket": result.get("ticket"),
+                    "success": result.get("success"),
+                    "qbTxnId": result.get("qbTxnId"),
+                    "qbTxnType": result.get("qbTxnType"),
+                    "qbErrorCode": result.get("qbErrorCode"),
+                    "qbErrorMessage": result.get("qbErrorMessage"),
+                    "retryable": result.get("retryable"),
+                }
+            )
+        return {"results": list(results), "failed": []}
+
+
+@dataclass
+class StatefulFakeConvexClient(FakeConvexClient):
+    """Tracks qbStatus per event the way convex/qb_queue.ts does."""
+
+    statuses: dict[str, str] = field(default_factory=dict)
+    apply_batch_sizes: list[int] = field(default_factory=list)
+    fail_apply: bool = False
+    session_in_flight: dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        for event in self.events:
+            self.statuses[event["eventId"]] = "pending"
+
+    def get_next_pending_event(
+        self,
+        limit: int = 1,
+        *,
+        now_ms: int | None = None,
+    ) -> dict[str, Any]:
+        pending = [e for e in self.events if self.statuses[e["eventId"]] == "pending"]
+        # Fresh copies: the service rewrites event lines in place.
+        return {"events": [{**event, "lines": list(event["lines"])} for event in pending[:limit]]}
+
+    def claim_event(
+        self,
+        event_id: str,
+        ticket: str,
+        results: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        status = self.statuses.get(event_id)
+        claimed = status == "pending" or (
+            status == "in_flight" and self.session_in_flight.get(ticket) == event_id
+        )
+        if claimed:
+            self.statuses[event_id] = "in_flight"
+            self.session_in_flight[ticket] = event_id
+            self.in_flight_calls.append({"eventId": event_id, "ticket": ticket})
+        applied = self.apply_qb_results(results)
+        return {"eventId": event_id, "claimed": claimed, "ticket": ticket, **applied}
+
+    def apply_qb_results(self, results: list[dict[str, Any]]) -> dict[str, Any]:
+        self.apply_batch_sizes.append(len(results))
+        if self.fail_apply:
+            raise RuntimeError("Convex command did not return parseable JSON.")
+        super().apply_qb_results(results)
+        for result in results:
+            if result["success"]:
+                self.statuses[result["eventId"]] = "applied"
+            elif (
+                result.get("retryable", True)
+                and result.get("qbErrorCode") not in {"3100", "3140", "3170", "3200", "3250"}
+            ):
+                self.statuses[result["eventId"]] = "pending"
+            else:
+                self.statuses[result["eventId"]] = "error"
+        return {"results": list(results), "failed": []}
+
 
 def main() -> None:
     run_missing_account_parser_smoke()
@@ -77,6 +163,12 @@ def main() -> None:
     run_auto_create_csv_mode_smoke()
     run_auto_create_missing_account_smoke()
     run_qbwc_mode_smoke()
+    run_batch_drain_smoke()
+    run_batch_connection_error_smoke()
+    run_batch_close_with_queued_events_smoke()
+    run_batch_two_sessions_smoke()
+    run_items_csv_parity_smoke()
+    run_undeliverable_results_smoke()
     print("QBWC_SMOKE_PASS")
 
 
@@ -668,5 +760,275 @@ def run_qbwc_mode_smoke() -> None:
     assert fake_convex.apply_calls[-1]["qbTxnId"] == "TXN-SMOKE-QBWC-1", "Transfer TxnID missing."
 
 
+def _batch_smoke_service(
+    event_count: int,
+    unknown_indexes: frozenset[int] = frozenset({1}),
+) -> tuple[QbwcService, StatefulFakeConvexClient, str]:
+    tmp_dir = Path(PROJECT_ROOT) / ".tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    qb_items_csv = tmp_dir / "smoke_qb_items_batch.csv"
+    qb_items_csv.write_text(
+        "Sku,Type\n"
+        "SMOKE-SKU-TEST,Inventory Part\n",
+        encoding="utf-8",
+    )
+    events = []
+    for index in range(event_count):
+        event_id = f"jh_fake_batch_{index}"
+        sku = "SMOKE-SKU-UNKNOWN" if index in unknown_indexes else "SMOKE-SKU-TEST"
+        events.append(
+            {
+                "eventId": event_id,
+                "eventType": "transfer",
+                "status": "committed",
+                "qbStatus": "pending",
+                "qbTxnType": "TransferInventoryAdd",
+                "effectiveDate": "2026-02-11",
+                "createdBy": "smoke-test",
+                "memo": "smoke batch transfer",
+                "idempotencyKey": event_id,
+                "lines": [
+                    {
+                        # Events that only reference an unknown item (by default
+                        # the second one) are settled without being sent.
+                        "sku": sku,
+                        "qty": 1,
+                        "qbItemFullName": sku,
+                        "fromSiteFullName": "Smoke A",
+                        "toSiteFullName": "Smoke B",
+                    }
+                ],
+            }
+        )
+    fake_convex = StatefulFakeConvexClient(events=events)
+    config = QbSyncConfig(
+        qbwc_username="qbwc-user",
+        qbwc_password="qbwc-pass",
+        qb_company_file="",
+        qbxml_version="13.0",
+        default_adjustment_account="Inventory Adjustments",
+        server_version="190Group-QBWC-0.1.0",
+        min_client_version="",
+        bind_host="127.0.0.1",
+        bind_port=8085,
+        convex_env_file="",
+        convex_run_prod=False,
+        qb_items_csv=str(qb_items_csv),
+        qb_items_source="csv",
+        qb_items_refresh_minutes=60,
+        qb_items_query_max_returned=1000,
+        qb_items_query_mode="auto",
+        qb_items_auto_create=False,
+        qb_accounts_auto_create=False,
+        qb_item_income_account_default="",
+        qb_item_cogs_account_default="",
+        qb_item_asset_account_default="",
+        qb_retry_lookahead_seconds=0,
+        debug_persist_requests=False,
+    )
+    service = QbwcService(config=config, convex_client=fake_convex)
+    ticket = service.authenticate("qbwc-user", "qbwc-pass")[0]
+    return service, fake_convex, ticket
+
+
+def _batch_send(service: QbwcService, ticket: str) -> str:
+    return service.send_request_xml(
+        ticket=ticket,
+        _hcp_response="",
+        _company_file_name="",
+        _qbxml_country="US",
+        _qbxml_major="13",
+        _qbxml_minor="0",
+    )
+
+
+def _batch_transfer_response(event_id: str, txn_id: str, status_code: str = "0") -> str:
+    return (
+        "<?xml version=\"1.0\"?>"
+        "<QBXML><QBXMLMsgsRs>"
+        f"<TransferInventoryAddRs requestID=\"{event_id}\" "
+        f"statusCode=\"{status_code}\" statusSeverity=\"Info\" statusMessage=\"Status\">"
+        f"<TransferInventoryRet><TxnID>{txn_id}</TxnID></TransferInventoryRet>"
+        "</TransferInventoryAddRs>"
+        "</QBXMLMsgsRs></QBXML>"
+    )
+
+
+def _in_flight(fake_convex: StatefulFakeConvexClient) -> list[str]:
+    return sorted(k for k, v in fake_convex.statuses.items() if v == "in_flight")
+
+
+def run_batch_drain_smoke() -> None:
+    service, fake_convex, ticket = _batch_smoke_service(5)
+
+    sent: list[str] = []
+    for _ in range(10):
+        request = _batch_send(service, ticket)
+        if not request:
+            break
+        in_flight = _in_flight(fake_convex)
+        assert len(in_flight) == 1, f"Only the event being sent should be claimed: {in_flight}"
+        event_id = in_flight[0]
+        sent.append(event_id)
+        status_code = "3140" if event_id == "jh_fake_batch_3" else "0"
+        service.receive_response_xml(
+            ticket=ticket,
+            response_xml=_batch_transfer_response(event_id, f"TXN-{event_id}", status_code),
+            hresult="",
+            message="",
+        )
+        assert not _in_flight(fake_convex), (
+            f"Result for claimed {event_id} must reach Convex before the next request."
+        )
+
+    assert sent == ["jh_fake_batch_0", "jh_fake_batch_2", "jh_fake_batch_3", "jh_fake_batch_4"], sent
+    assert fake_convex.statuses["jh_fake_batch_1"] == "applied", "Empty event should be settled."
+    assert fake_convex.statuses["jh_fake_batch_3"] == "error", "Failed event should be settled."
+    assert not _in_flight(fake_convex), "No event may stay in flight after the batch drains."
+    assert service.close_connection(ticket) == "OK"
+    service.shutdown()
+
+
+def run_batch_connection_error_smoke() -> None:
+    service, fake_convex, ticket = _batch_smoke_service(5)
+
+    assert _batch_send(service, ticket), "Expected the first event request."
+    service.receive_response_xml(
+        ticket=ticket,
+        response_xml=_batch_transfer_response("jh_fake_batch_0", "TXN-0"),
+        hresult="",
+        message="",
+    )
+    assert fake_convex.statuses["jh_fake_batch_0"] == "applied"
+    assert _batch_send(service, ticket), "Expected the second event request."
+    assert _in_flight(fake_convex) == ["jh_fake_batch_2"], _in_flight(fake_convex)
+
+    assert service.connection_error(ticket, "0x80040408", "QuickBooks closed") == "done"
+    assert service.close_connection(ticket) == "OK"
+    assert not _in_flight(fake_convex), f"Events stranded in flight: {_in_flight(fake_convex)}"
+    assert fake_convex.statuses["jh_fake_batch_2"] == "pending", "Connection error should be retryable."
+    assert fake_convex.statuses["jh_fake_batch_3"] == "pending"
+    assert fake_convex.statuses["jh_fake_batch_4"] == "pending"
+    service.shutdown()
+
+
+def run_batch_close_with_queued_events_smoke() -> None:
+    service, fake_convex, ticket = _batch_smoke_service(5)
+
+    assert _batch_send(service, ticket), "Expected the first event request."
+    service.receive_response_xml(
+        ticket=ticket,
+        response_xml=_batch_transfer_response("jh_fake_batch_0", "TXN-0"),
+        hresult="",
+        message="",
+    )
+    assert service.close_connection(ticket) == "OK"
+    assert fake_convex.statuses["jh_fake_batch_0"] == "applied"
+    assert fake_convex.statuses["jh_fake_batch_1"] == "applied", "Settled empty event was dropped."
+    assert not _in_flight(fake_convex), f"Events stranded in flight: {_in_flight(fake_convex)}"
+    for event_id in ("jh_fake_batch_2", "jh_fake_batch_3", "jh_fake_batch_4"):
+        assert fake_convex.statuses[event_id] == "pending", f"{event_id} should still be pending."
+    service.shutdown()
+
+
+def run_batch_two_sessions_smoke() -> None:
+    service, fake_convex, ticket_a = _batch_smoke_service(5)
+    ticket_b = service.authenticate("qbwc-user", "qbwc-pass")[0]
+
+    assert _batch_send(service, ticket_a), "Expected the first event request."
+    assert _in_flight(fake_convex) == ["jh_fake_batch_0"], _in_flight(fake_convex)
+    # B fetches while A still has jh_fake_batch_2 queued locally, and claims it first.
+    assert _batch_send(service, ticket_b), "Expected a request for the second session."
+    assert fake_convex.session_in_flight[ticket_b] == "jh_fake_batch_2"
+
+    service.receive_response_xml(
+        ticket=ticket_a,
+        response_xml=_batch_transfer_response("jh_fake_batch_0", "TXN-0"),
+        hresult="",
+        message="",
+    )
+    assert _batch_send(service, ticket_a), "Expected A's next event request."
+    assert fake_convex.session_in_flight[ticket_a] == "jh_fake_batch_3", (
+        "A must skip the event B already claimed."
+    )
+    assert service.close_connection(ticket_a) == "OK"
+    assert service.close_connection(ticket_b) == "OK"
+    service.shutdown()
+
+
+def _items_csv_parity_request(csv_text: str) -> str:
+    service, fake_convex, ticket = _batch_smoke_service(1, unknown_indexes=frozenset())
+    Path(service.config.qb_items_csv).write_text(csv_text, encoding="utf-8-sig", newline="")
+    fake_convex.events[0]["lines"] = [
+        {
+            "sku": sku,
+            "qty": 1,
+            "qbItemFullName": sku,
+            "fromSiteFullName": "Smoke A",
+            "toSiteFullName": "Smoke B",
+        }
+        for sku in ("00123", "123", "LEAF", "007", "AFTER-NOTE", "FAKE-SKU")
+    ]
+    request = _batch_send(service, ticket)
+    service.shutdown()
+    return request
+
+
+def run_items_csv_parity_smoke() -> None:
+    csv_text = (
+        "Sku,Type,Description\r\n"
+        "00123,Inventory Part,plain\r\n"
+        "  PARENT:LEAF ,Inventory Part,\"quoted, with comma\"\r\n"
+        "007,Service,not a part\r\n"
+        "AFTER-NOTE,Inventory Part,\"first line\r\nFAKE-SKU,Inventory Part,still quoted\"\r\n"
+        ",Inventory Part,blank sku\r\n"
+    )
+    # The appended short row makes pyarrow refuse the file, so the second
+    # request comes from the csv.reader path and the two must agree.
+    fast = _items_csv_parity_request(csv_text)
+    fallback = _items_csv_parity_request(csv_text + "RAGGED\r\n")
+    assert fast == fallback, "pyarrow and csv.reader item keys differ."
+    for kept in (">00123<", ">LEAF<", ">AFTER-NOTE<"):
+        assert kept in fast, f"Expected {kept} in the filtered request."
+    for dropped in (">123<", ">007<", ">FAKE-SKU<"):
+        assert dropped not in fast, f"Unexpected {dropped} in the filtered request."
+
+
+def run_undeliverable_results_smoke() -> None:
+    # Only the last event references a known item; the rest are settled unsent.
+    service, fake_convex, ticket = _batch_smoke_service(20, unknown_indexes=frozenset(range(19)))
+    undelivered_path = Path(".tmp") / "qb_results_undelivered.jsonl"
+    undelivered_path.unlink(missing_ok=True)
+
+    # Convex keeps failing: refetching the same events must not queue their results twice.
+    fake_convex.fail_apply = True
+    assert _batch_send(service, ticket) == "", "Every fetched event is empty; nothing should be sent."
+    assert _batch_send(service, ticket) == ""
+    assert set(fake_convex.apply_batch_sizes) == {10}, fake_convex.apply_batch_sizes
+
+    # Once Convex recovers, the held results go out before the next fetch and
+    # the next settled ones ride along with the claim.
+    fake_convex.fail_apply = False
+    fake_convex.apply_batch_sizes.clear()
+    assert _batch_send(service, ticket), "Expected a request for the last event."
+    assert fake_convex.apply_batch_sizes == [10, 9], fake_convex.apply_batch_sizes
+    assert _in_flight(fake_convex) == ["jh_fake_batch_19"], _in_flight(fake_convex)
+
+    # A result Convex refuses while the session closes is recorded, not dropped.
+    fake_convex.fail_apply = True
+    service.receive_response_xml(
+        ticket=ticket,
+        response_xml=_batch_transfer_response("jh_fake_batch_19", "TXN-19", "3140"),
+        hresult="",
+        message="",
+    )
+    assert service.close_connection(ticket) == "OK"
+    recorded = [json.loads(line) for line in undelivered_path.read_text(encoding="utf-8").splitlines()]
+    assert [entry["result"]["eventId"] for entry in recorded] == ["jh_fake_batch_19"], recorded
+    assert recorded[0]["reason"] == "connection closed", recorded[0]
+    undelivered_path.unlink()
+    service.shutdown()
+
+
 if __name__ == "__main__":
     main()
@@ -201,7 +201,10 @@ def run() -> None:
     print("QBWC middleware is running")
     print(f"SOAP endpoint: http://{config.bind_host}:{config.bind_port}/qbwc")
     print("=" * 60)
-    app.run(host=config.bind_host, port=config.bind_port, debug=False)
+    try:
+        app.run(host=config.bind_host, port=config.bind_port, debug=False)
+    finally:
+        service.shutdown()
 
 
 if __name__ == "__main__":
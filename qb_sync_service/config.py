@@ -43,6 +43,8 @@ class QbSyncConfig:
     qb_item_cogs_account_default: str
     qb_item_asset_account_default: str
     qb_retry_lookahead_seconds: int
+    debug_persist_requests: bool = True
+    qbwc_max_sessions: int = 256
 
     @staticmethod
     def from_env() -> "QbSyncConfig":
@@ -88,4 +90,6 @@ class QbSyncConfig:
                 0,
                 _env_int("QB_RETRY_LOOKAHEAD_SECONDS", 0),
             ),
+            debug_persist_requests=_env_bool("QBWC_DEBUG_PERSIST_REQUESTS", True),
+            qbwc_max_sessions=max(1, _env_int("QBWC_MAX_SESSIONS", 256)),
         )
@@ -8,6 +8,36 @@ from pathlib import Path
 from typing import Any
 
 
+def build_qb_result_payload(
+    event_id: str,
+    ticket: str | None,
+    *,
+    success: bool,
+    qb_txn_id: str | None = None,
+    qb_txn_type: str | None = None,
+    qb_error_code: str | None = None,
+    qb_error_message: str | None = None,
+    retryable: bool | None = None,
+) -> dict[str, Any]:
+    payload: dict[str, Any] = {
+        "eventId": event_id,
+        "success": success,
+    }
+    if ticket is not None:
+        payload["ticket"] = ticket
+    if qb_txn_id is not None:
+        payload["qbTxnId"] = qb_txn_id
+    if qb_txn_type is not None:
+        payload["qbTxnType"] = qb_txn_type
+    if qb_error_code is not None:
+        payload["qbErrorCode"] = qb_error_code
+    if qb_error_message is not None:
+        payload["qbErrorMessage"] = qb_error_message
+    if retryable is not None:
+        payload["retryable"] = retryable
+    return payload
+
+
 @dataclass
 class ConvexCliClient:
     env_file: str = ""
@@ -94,7 +124,18 @@ class ConvexCliClient:
         payload: dict[str, Any] = {"limit": limit}
         if now_ms is not None:
             payload["nowMs"] = now_ms
-        return self.run("qb_queue:getNextPendingQbEvent", payload)
+        result = self.run("qb_queue:getNextPendingQbEvent", payload)
+        # Normalize ids once here so callers can index event["eventId"] directly.
+        events: list[dict[str, Any]] = []
+        for event in result.get("events") or ():
+            event_id = event.get("eventId")
+            if not event_id:
+                continue
+            if not isinstance(event_id, str):
+                event["eventId"] = str(event_id)
+            events.append(event)
+        result["events"] = events
+        return result
 
     def mark_event_in_flight(self, event_id: str, ticket: str) -> dict[str, Any]:
         return self.run(
@@ -102,6 +143,17 @@ class ConvexCliClient:
             {"eventId": event_id, "ticket": ticket},
         )
 
+    def claim_event(
+        self,
+        event_id: str,
+        ticket: str,
+        results: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        return self.run(
+            "qb_queue:claimEvent",
+            {"eventId": event_id, "ticket": ticket, "results": results},
+        )
+
     def apply_qb_result(
         self,
         event_id: str,
@@ -114,20 +166,17 @@ class ConvexCliClient:
         qb_error_message: str | None = None,
         retryable: bool | None = None,
     ) -> dict[str, Any]:
-        payload: dict[str, Any] = {
-            "eventId": event_id,
-            "success": success,
-        }
-        if ticket is not None:
-            payload["ticket"] = ticket
-        if qb_txn_id is not None:
-            payload["qbTxnId"] = qb_txn_id
-        if qb_txn_type is not None:
-            payload["qbTxnType"] = qb_txn_type
-        if qb_error_code is not None:
-            payload["qbErrorCode"] = qb_error_code
-        if qb_error_message is not None:
-            payload["qbErrorMessage"] = qb_error_message
-        if retryable is not None:
-            payload["retryable"] = retryable
+        payload = build_qb_result_payload(
+            event_id,
+            ticket,
+            success=success,
+            qb_txn_id=qb_txn_id,
+            qb_txn_type=qb_txn_type,
+            qb_error_code=qb_error_code,
+            qb_error_message=qb_error_message,
+            retryable=retryable,
+        )
         return self.run("qb_queue:applyQbResult", payload)
+
+    def apply_qb_results(self, results: list[dict[str, Any]]) -> dict[str, Any]:
+        return self.run("qb_queue:applyQbResults", {"results": results})
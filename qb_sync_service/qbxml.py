@@ -562,9 +562,67 @@ class QbxmlResponseResult:
     txn_type: str | None
 
 
-def parse_qbxml_response(response_xml: str) -> QbxmlResponseResult:
-    if not response_xml or not response_xml.strip():
+# Shared result for empty bodies; callers only read parse results, never mutate them.
+_EMPTY_RESPONSE_RESULT = QbxmlResponseResult(
+    success=False,
+    status_code="EMPTY_RESPONSE",
+    status_severity="Error",
+    status_message="Empty qbXML response.",
+    txn_id=None,
+    txn_type=None,
+)
+
+
+# Blank result for callers that keep a reusable `out` slot for parse_qbxml_response.
+def new_response_result() -> QbxmlResponseResult:
+    return QbxmlResponseResult(
+        success=False,
+        status_code="",
+        status_severity="",
+        status_message="",
+        txn_id=None,
+        txn_type=None,
+    )
+
+
+def _response_result(
+    out: QbxmlResponseResult | None,
+    *,
+    success: bool,
+    status_code: str,
+    status_severity: str,
+    status_message: str,
+    txn_id: str | None,
+    txn_type: str | None,
+) -> QbxmlResponseResult:
+    if out is None:
         return QbxmlResponseResult(
+            success=success,
+            status_code=status_code,
+            status_severity=status_severity,
+            status_message=status_message,
+            txn_id=txn_id,
+            txn_type=txn_type,
+        )
+    out.success = success
+    out.status_code = status_code
+    out.status_severity = status_severity
+    out.status_message = status_message
+    out.txn_id = txn_id
+    out.txn_type = txn_type
+    return out
+
+
+# When `out` is given it is filled in place and returned instead of allocating a new result.
+def parse_qbxml_response(
+    response_xml: str,
+    out: QbxmlResponseResult | None = None,
+) -> QbxmlResponseResult:
+    if not response_xml or not response_xml.strip():
+        if out is None:
+            return _EMPTY_RESPONSE_RESULT
+        return _response_result(
+            out,
             success=False,
             status_code="EMPTY_RESPONSE",
             status_severity="Error",
@@ -576,7 +634,8 @@ def parse_qbxml_response(response_xml: str) -> QbxmlResponseResult:
     try:
         root = ET.fromstring(response_xml)
     except ET.ParseError as exc:
-        return QbxmlResponseResult(
+        return _response_result(
+            out,
             success=False,
             status_code="PARSE_ERROR",
             status_severity="Error",
@@ -593,7 +652,8 @@ def parse_qbxml_response(response_xml: str) -> QbxmlResponseResult:
             break
 
     if rs_element is None:
-        return QbxmlResponseResult(
+        return _response_result(
+            out,
             success=False,
             status_code="NO_RS_NODE",
             status_severity="Error",
@@ -602,7 +662,7 @@ def parse_qbxml_response(response_xml: str) -> QbxmlResponseResult:
             txn_type=None,
         )
 
-    status_code = rs_element.attrib.get("statusCode", "UNKNOWN")
+    status_code = rs_element.attrib.get("statusCode", "UNKNOWN").strip()
     status_severity = rs_element.attrib.get("statusSeverity", "Error")
     status_message = rs_element.attrib.get("statusMessage", "")
 
@@ -618,7 +678,8 @@ def parse_qbxml_response(response_xml: str) -> QbxmlResponseResult:
         txn_type = node_name[:-2]
 
     success = status_code in {"0", "1"} and status_severity.lower() != "error"
-    return QbxmlResponseResult(
+    return _response_result(
+        out,
         success=success,
         status_code=status_code,
         status_severity=status_severity,
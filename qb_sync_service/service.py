@@ -1,27 +1,50 @@
 from __future__ import annotations
 
 import csv
+import hashlib
 import json
 import re
+import sys
+import threading
 import time
 import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping
 from xml.etree import ElementTree as ET
-from xml.sax.saxutils import escape
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib json encoder.
+    orjson = None
 
 from qb_sync_service.config import QbSyncConfig
-from qb_sync_service.convex_cli import ConvexCliClient
+from qb_sync_service.convex_cli import ConvexCliClient, build_qb_result_payload
 from qb_sync_service.qbxml import (
     build_account_add_qbxml,
     build_item_inventory_add_qbxml,
     build_item_inventory_mods_qbxml,
+    QbxmlResponseResult,
     build_qbxml_for_event,
+    new_response_result,
     parse_qbxml_response,
 )
 
 
+# (event_id, event, original_lines, qb_items_cache_generation, filter_result)
+_PreparedEvent = tuple[
+    str,
+    dict[str, Any],
+    Any,
+    int,
+    tuple[dict[str, Any], int, int, list[dict[str, Any]]],
+]
+
+
 @dataclass
 class SessionState:
     ticket: str
@@ -31,6 +54,8 @@ class SessionState:
     in_flight_request_kind: str = ""
     last_request_xml: str = ""
     pending_event: dict[str, Any] | None = None
+    pending_event_id: str | None = None
+    pending_event_txn_type: str | None = None
     pending_event_original_line_count: int = 0
     pending_event_dropped_line_count: int = 0
     pending_account_create_queue: list[dict[str, Any]] = field(default_factory=list)
@@ -39,8 +64,18 @@ class SessionState:
     in_flight_item_create: dict[str, Any] | None = None
     known_account_keys: set[str] = field(default_factory=set)
     pending_missing_account_attempt_keys: list[str] = field(default_factory=list)
-
-
+    local_event_queue: deque[_PreparedEvent] = field(default_factory=deque)
+    local_event_queue_fetched_at: float = 0.0
+    pending_results: list[dict[str, Any]] = field(default_factory=list)
+    # True once pending_results holds a result for an event this session claimed.
+    pending_results_claimed: bool = False
+    # Reused by parse_qbxml_response for every response on this session.
+    in_flight_parsed_response: QbxmlResponseResult = field(default_factory=new_response_result)
+
+
+# Version strings come from config and the QBWC handshake, so a handful of
+# distinct values repeat on every call.
+@lru_cache(maxsize=64)
 def _parse_version(value: str) -> tuple[int, ...]:
     parts: list[int] = []
     for token in (value or "").split("."):
@@ -79,6 +114,7 @@ def _parse_bool(value: str) -> bool | None:
     return None
 
 
+@lru_cache(maxsize=32)
 def _parse_qbxml_version(value: str) -> tuple[int, int]:
     parsed = _parse_version(value)
     if not parsed:
@@ -126,18 +162,80 @@ _SKU_COLUMN_CANDIDATES = (
 )
 
 
+# QB's item Type column is a closed vocabulary; only these normalized values
+# are inventory parts ("Inventory Assembly" and "Non-inventory Part" are not).
+_INVENTORY_PART_TYPES = frozenset({"inventorypart", "invpart"})
+
+
+_XML_ESCAPE_TABLE = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        "\"": "&quot;",
+        "'": "&apos;",
+    }
+)
+
+
 _QB_ITEMS_SOURCE_CSV = "csv"
 _QB_ITEMS_SOURCE_QBWC = "qbwc"
 _QB_ITEMS_QUERY_MODE_INVENTORY = "item_inventory_query"
 _QB_ITEMS_QUERY_MODE_FALLBACK = "item_query_fallback"
 
+# QBWC asks for progress after every response; reuse the Convex "has pending"
+# answer for this long instead of polling on each roundtrip.
+_PENDING_EVENTS_CACHE_TTL_SECONDS = 1.0
+
+# Auto-created items are batched into one cache-file rewrite at most this often.
+_QB_ITEMS_CACHE_PERSIST_INTERVAL_SECONDS = 5.0
+# Shared read-only defaults for `.get(...) or ...` lookups on the polling path,
+# so idle polls and missing keys do not allocate a fresh list or dict.
+_EMPTY_TUPLE: tuple[Any, ...] = ()
+_EMPTY_MAPPING: Mapping[str, Any] = MappingProxyType({})
+# Events are fetched in batches of this size per Convex round-trip.
+_PENDING_EVENT_FETCH_LIMIT = 10
+# Prefetched events older than this are dropped locally and fetched again. They
+# are only claimed when sent, so keep this to about one QBWC update cycle; a
+# stale entry another session already claimed is skipped by claimEvent.
+_LOCAL_EVENT_QUEUE_MAX_AGE_SECONDS = 30.0
+# Buffered applyQbResult payloads are sent once this many accumulate.
+_QB_RESULT_FLUSH_BATCH_SIZE = 16
+
+# Compact output: the meta file is a machine-read debug dump, not hand-edited.
+_DEBUG_JSON_ENCODER = json.JSONEncoder(
+    separators=(",", ":"),
+    ensure_ascii=False,
+).encode
+
+
+def _encode_debug_json(data: dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+    return _DEBUG_JSON_ENCODER(data).encode("utf-8") + b"\n"
+
+
+# Deletes every non-alphanumeric ASCII character in one str.translate pass.
+_HEADER_DELETE_TABLE = str.maketrans(
+    "", "", "".join(chr(code) for code in range(128) if not chr(code).isalnum())
+)
+
 
 def _normalize_header(value: str) -> str:
+    if value.isascii():
+        return value.lower().translate(_HEADER_DELETE_TABLE)
     return "".join(ch for ch in value.lower() if ch.isalnum())
 
 
+def _fold_item_key(value: str) -> str:
+    # For ASCII text lower() equals casefold() and skips the Unicode case tables.
+    if value.isascii():
+        return value.lower()
+    return value.casefold()
+
+
 def _normalize_item_key(value: str) -> str:
-    return (value or "").strip().casefold()
+    return _fold_item_key(value.strip() if value else "")
 
 
 def _add_item_key_variants(keys: set[str], raw_value: str) -> None:
@@ -159,26 +257,104 @@ def _localname(tag: str) -> str:
     return tag
 
 
+def _strip_xml_namespaces(root: ET.Element) -> None:
+    for element in root.iter():
+        element.tag = _localname(element.tag)
+
+
+_TAG_ITEM_INVENTORY_RET = sys.intern("ItemInventoryRet")
+_TAG_ITEM_INVENTORY_QUERY_RS = sys.intern("ItemInventoryQueryRs")
+_TAG_ITEM_QUERY_RS = sys.intern("ItemQueryRs")
+_ITEM_QUERY_RS_TAGS = frozenset({_TAG_ITEM_INVENTORY_QUERY_RS, _TAG_ITEM_QUERY_RS})
+_ITEM_INVENTORY_RET_PATH = f".//{_TAG_ITEM_INVENTORY_RET}"
+
+
+def _merge_key_sets(accumulated: set[str], page: set[str]) -> set[str]:
+    """
+    Merge two freshly built key sets by growing the larger one.
+    CPython's set.clear() releases the hash table, so capacity cannot be
+    reserved up front; folding the smaller set in keeps resize work bounded
+    by the smaller side (the first page is adopted outright).
+    """
+    if len(page) > len(accumulated):
+        page.update(accumulated)
+        return page
+    accumulated.update(page)
+    return accumulated
+
+
+def _file_sha1(path: Path) -> str:
+    digest = hashlib.sha1(usedforsecurity=False)
+    with path.open("rb") as infile:
+        for block in iter(lambda: infile.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def _pyarrow_csv() -> tuple[Any, Any] | None:
+    """
+    (pyarrow, pyarrow.csv), imported on the first CSV load rather than at
+    middleware start; None when pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:  # Optional: fall back to the stdlib csv reader.
+        return None
+    return pa, pa_csv
+
+
+def _read_csv_columns_with_arrow(
+    csv_path: Path,
+    type_col: str,
+    sku_col: str,
+) -> Iterable[tuple[str, str]] | None:
+    """
+    Read just the type and SKU columns with pyarrow's C++ CSV parser.
+    Returns None when pyarrow is unavailable or cannot parse the file
+    (ragged rows, invalid UTF-8, ...), so callers fall back to csv.reader.
+    """
+    arrow = _pyarrow_csv()
+    if arrow is None:
+        return None
+    pa, pa_csv = arrow
+    try:
+        table = pa_csv.read_csv(
+            csv_path,
+            # QB exports quote multi-line descriptions.
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=[type_col, sku_col],
+                # SKUs such as "00123" must stay text.
+                column_types={type_col: pa.string(), sku_col: pa.string()},
+            ),
+        )
+    except (pa.ArrowException, OSError):
+        return None
+    return zip(table.column(type_col).to_pylist(), table.column(sku_col).to_pylist())
+
+
 def _is_inventory_part(type_value: str) -> bool:
-    key = _normalize_header(type_value.strip())
-    if "inventoryassembly" in key:
-        return False
-    return "inventorypart" in key
+    return _normalize_header(type_value) in _INVENTORY_PART_TYPES
+
+
+def _build_header_map(headers: tuple[str, ...]) -> dict[str, str]:
+    return {_normalize_header(header): header for header in headers}
 
 
 def _resolve_csv_column(
-    headers: list[str],
+    header_map: dict[str, str],
     candidates: tuple[str, ...],
     label: str,
 ) -> str:
-    header_map = {_normalize_header(header): header for header in headers}
     for candidate in candidates:
         resolved = header_map.get(_normalize_header(candidate))
         if resolved:
             return resolved
     raise ValueError(
         f"Unable to find {label} column in QB export CSV. "
-        f"Headers: {headers}"
+        f"Headers: {list(header_map.values())}"
     )
 
 
@@ -200,6 +376,28 @@ def _line_item_candidates(line: dict[str, Any]) -> set[str]:
     return {item for item in candidates if item}
 
 
+def _line_matches(line: dict[str, Any], keys: set[str] | frozenset[str]) -> bool | None:
+    """
+    Short-circuit form of `_line_item_candidates(line)` vs `keys`.
+    Returns None when the line carries no item reference at all.
+    """
+    has_reference = False
+    for raw in (line.get("qbItemFullName"), line.get("sku")):
+        if not raw:
+            continue
+        value = str(raw).strip()
+        if not value:
+            continue
+        has_reference = True
+        if _normalize_item_key(value) in keys:
+            return True
+        if ":" in value:
+            leaf = value.rsplit(":", 1)[1].strip()
+            if leaf and _normalize_item_key(leaf) in keys:
+                return True
+    return False if has_reference else None
+
+
 def _line_item_full_name(line: dict[str, Any]) -> str:
     return str(line.get("qbItemFullName") or line.get("sku") or "").strip()
 
@@ -208,17 +406,15 @@ def _optional_text(value: Any) -> str:
     return str(value or "").strip()
 
 
-def _extract_ref_full_name(element: ET.Element) -> str:
-    for child in element:
-        if _localname(child.tag) == "FullName":
-            text = (child.text or "").strip()
-            if text:
-                return text
-    return ""
+@lru_cache(maxsize=1024)
+def _uuid5_url(seed: str) -> str:
+    # Request IDs are derived from stable seeds, so retries of the same event hit the cache.
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, seed))
 
 
-def _is_duplicate_name_conflict(status_code: str) -> bool:
-    return (status_code or "").strip() == "3100"
+# qbXML statusCode 3100: "The name ... is already in use." Codes are stripped by
+# parse_qbxml_response, so a plain membership test is enough.
+_DUPLICATE_NAME_STATUS_CODES = frozenset({"3100"})
 
 
 def _is_invalid_item_account_reference(status_code: str, status_message: str) -> bool:
@@ -355,28 +551,69 @@ def _is_qb_success_response(status_code: str, status_severity: str) -> bool:
     return status_code in {"0", "1"} and status_severity.lower() != "error"
 
 
-def _is_hresult_parse_error(hresult: str) -> bool:
-    return (hresult or "").strip().casefold() == "0x80040400"
+# HRESULT 0x80040400: QuickBooks could not parse the qbXML request. The digits
+# carry no case, so listing both prefix spellings avoids a casefold per response.
+_HRESULT_PARSE_ERROR_CODES = frozenset({"0x80040400", "0X80040400"})
 
 
 class QbwcService:
     def __init__(self, config: QbSyncConfig, convex_client: ConvexCliClient):
         self.config = config
         self.convex = convex_client
-        self.sessions: dict[str, SessionState] = {}
+        # LRU order: the least recently used session is evicted past qbwc_max_sessions.
+        self.sessions: OrderedDict[str, SessionState] = OrderedDict()
+        # (raw ticket, session) of the most recent lookup; QBWC usually drives one ticket at a time.
+        self._last_session: tuple[str, SessionState] | None = None
         self._cached_qb_items_path: str = ""
         self._cached_qb_items_mtime_ns: int = -1
-        self._cached_qb_inventory_part_keys: set[str] = set()
+        self._cached_qb_items_size: int = -1
+        self._cached_qb_items_sha1: str = ""
+        # frozenset when loaded from CSV; the live item query publishes its
+        # accumulator set by reference instead of copying it.
+        self._cached_qb_inventory_part_keys: set[str] | frozenset[str] = frozenset()
         self._cached_qb_inventory_part_names: set[str] = set()
         self._cached_qb_inventory_part_details: dict[str, dict[str, Any]] = {}
         self._cached_qb_inventory_part_detail_lookup: dict[str, dict[str, Any]] = {}
         self._cached_qb_items_loaded_at_monotonic: float = 0.0
         self._cached_qb_items_loaded_at_epoch_ms: int = 0
+        # Bumped whenever the known-item keys change so prepared events can be re-filtered.
+        self._qb_items_cache_generation: int = 0
         self._qb_items_query_in_progress: bool = False
         self._qb_items_query_iterator_id: str = ""
         self._qb_items_query_accumulator: set[str] = set()
         self._qb_items_query_name_accumulator: set[str] = set()
         self._qb_items_query_detail_accumulator: dict[str, dict[str, Any]] = {}
+        self._has_pending_cache: tuple[float, bool] | None = None
+        self._tmp_dir = Path(".tmp")
+        self._tmp_dir_ensured = False
+        self._last_request_payload_path = self._tmp_dir / "last_send_request_payload.xml"
+        self._last_request_meta_path = self._tmp_dir / "last_send_request_meta.json"
+        # Event results Convex never accepted, one JSON object per line, for manual replay.
+        self._undelivered_results_path = self._tmp_dir / "qb_results_undelivered.jsonl"
+        self._qb_items_cache_path = self._tmp_dir / "qb_items_live_from_qbwc.csv"
+        self._qb_items_detail_cache_path = self._tmp_dir / "qb_items_live_detail_from_qbwc.csv"
+        # Config is immutable, so build the CSV path once; only stat() runs per load.
+        self._qb_items_csv_path = Path(config.qb_items_csv).expanduser()
+        self._qb_items_csv_path_str = str(self._qb_items_csv_path)
+        self._persisted_qb_item_names: frozenset[str] = frozenset()
+        self._qb_items_cache_dirty = False
+        self._qb_items_cache_last_persist: float = 0.0
+        # Cache files are written by a single background worker; snapshots submitted
+        # while a write is pending replace each other so only the latest is written.
+        self._persist_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="qb-items-cache",
+        )
+        self._persist_lock = threading.Lock()
+        self._persist_snapshot: tuple[tuple[str, ...], tuple[dict[str, Any], ...]] | None = None
+        self._persist_scheduled = False
+        # receiveResponseXML dispatch by in_flight_request_kind; anything else
+        # ("event", "item_account_sync", "") is handled as an event response.
+        self._response_handlers = {
+            "item_query": self._handle_item_query_response,
+            "account_create": self._handle_account_create_response,
+            "item_create": self._handle_item_create_response,
+        }
         configured_mode = (self.config.qb_items_query_mode or "").strip().casefold()
         if configured_mode in {
             "itemquery",
@@ -392,15 +629,56 @@ class QbwcService:
             self._qb_items_query_request_mode = _QB_ITEMS_QUERY_MODE_INVENTORY
 
     def _session(self, ticket: str) -> SessionState:
-        clean_ticket = (ticket or "").strip()
+        last_session = self._last_session
+        if last_session is not None and last_session[0] == ticket:
+            # No LRU touch here; _store_session accounts for this session lazily.
+            return last_session[1]
+        clean_ticket = ticket.strip() if ticket else ""
         if not clean_ticket:
-            clean_ticket = str(uuid.uuid4())
-        existing = self.sessions.get(clean_ticket)
-        if existing is not None:
-            return existing
-        created = SessionState(ticket=clean_ticket)
-        self.sessions[clean_ticket] = created
-        return created
+            # Blank tickets get a throwaway session each call; never store those,
+            # or they would take LRU slots from live QBWC sessions.
+            return SessionState(ticket=str(uuid.uuid4()))
+        session = self.sessions.get(clean_ticket)
+        if session is None:
+            session = SessionState(ticket=clean_ticket)
+            self._store_session(session)
+        else:
+            self.sessions.move_to_end(clean_ticket)
+        self._last_session = (ticket, session)
+        return session
+
+    def _store_session(self, session: SessionState) -> None:
+        sessions = self.sessions
+        last_session = self._last_session
+        if (
+            last_session is not None
+            and len(sessions) >= self.config.qbwc_max_sessions
+            and last_session[1].ticket in sessions
+        ):
+            # Fast-path lookups skip move_to_end, so the cached session may look
+            # old while being the most recently used one.
+            sessions.move_to_end(last_session[1].ticket)
+        sessions[session.ticket] = session
+        while len(sessions) > self.config.qbwc_max_sessions:
+            _, evicted = sessions.popitem(last=False)
+            self._evict_session(evicted)
+
+    def _evict_session(self, session: SessionState) -> None:
+        """
+        Drop a least-recently-used session without losing its buffered results.
+        Its prefetched events were never claimed, so they stay pending in Convex.
+        """
+        if self._last_session is not None and self._last_session[1] is session:
+            self._last_session = None
+        if session.in_flight_request_kind == "item_query":
+            self._reset_qb_items_query_state()
+        self._release_qb_results(session, reason="session evicted")
+        session.local_event_queue.clear()
+
+    def _ensure_tmp_dir(self) -> None:
+        if not self._tmp_dir_ensured:
+            self._tmp_dir.mkdir(parents=True, exist_ok=True)
+            self._tmp_dir_ensured = True
 
     def _normalized_items_source(self) -> str:
         source = (self.config.qb_items_source or "").strip().casefold()
@@ -467,7 +745,7 @@ class QbwcService:
         if continue_iterator_id:
             iterator_attr = (
                 ' iterator="Continue"'
-                f' iteratorID="{escape(continue_iterator_id)}"'
+                f' iteratorID="{continue_iterator_id.translate(_XML_ESCAPE_TABLE)}"'
             )
             if self._qb_items_query_request_mode == _QB_ITEMS_QUERY_MODE_FALLBACK:
                 body = (
@@ -499,7 +777,7 @@ class QbwcService:
 
         return (
             "<?xml version=\"1.0\" encoding=\"utf-8\"?>"
-            f"<?qbxml version=\"{escape(qbxml_version)}\"?>"
+            f"<?qbxml version=\"{qbxml_version.translate(_XML_ESCAPE_TABLE)}\"?>"
             "<QBXML>"
             "<QBXMLMsgsRq onError=\"stopOnError\">"
             f"{body}"
@@ -533,19 +811,23 @@ class QbwcService:
         except ET.ParseError as exc:
             raise ValueError(f"Unable to parse ItemInventoryQueryRs XML: {exc}") from exc
 
+        if "}" in root.tag:
+            # qbXML from QBWC is namespace-free; normalize the rare namespaced
+            # payload once so the lookups below can match plain tag names.
+            _strip_xml_namespaces(root)
+
         query_rs: ET.Element | None = None
         for element in root.iter():
-            local_name = _localname(element.tag)
-            if local_name in {"ItemInventoryQueryRs", "ItemQueryRs"}:
+            if element.tag in _ITEM_QUERY_RS_TAGS:
                 query_rs = element
                 break
 
         if query_rs is None:
             raise ValueError("No ItemInventoryQueryRs/ItemQueryRs node found in QuickBooks response.")
 
-        status_code = query_rs.attrib.get("statusCode", "UNKNOWN")
-        status_severity = query_rs.attrib.get("statusSeverity", "Error")
-        status_message = query_rs.attrib.get("statusMessage", "").strip()
+        status_code = query_rs.get("statusCode", "UNKNOWN")
+        status_severity = query_rs.get("statusSeverity", "Error")
+        status_message = query_rs.get("statusMessage", "").strip()
         if not _is_qb_success_response(status_code, status_severity):
             raise ValueError(
                 "QuickBooks ItemInventoryQuery failed "
@@ -553,62 +835,28 @@ class QbwcService:
                 f"{status_message or 'Unknown status message.'}"
             )
 
-        iterator_id = (query_rs.attrib.get("iteratorID") or "").strip()
-        iterator_remaining = _parse_int(query_rs.attrib.get("iteratorRemainingCount", "") or "")
+        iterator_id = (query_rs.get("iteratorID") or "").strip()
+        iterator_remaining = _parse_int(query_rs.get("iteratorRemainingCount", "") or "")
         remaining_count = iterator_remaining if iterator_remaining is not None else 0
 
         keys: set[str] = set()
         item_names: set[str] = set()
         item_details: dict[str, dict[str, Any]] = {}
-        for element in query_rs.iter():
-            local_name = _localname(element.tag)
-            # In fallback mode, ItemQueryRs may include many item types.
-            if local_name != "ItemInventoryRet":
-                continue
-            full_name = ""
-            name = ""
-            list_id = ""
-            edit_sequence = ""
-            is_active: bool | None = None
-            quantity_on_hand: float | None = None
-            sales_price: float | None = None
-            purchase_cost: float | None = None
-            income_account_full_name = ""
-            cogs_account_full_name = ""
-            asset_account_full_name = ""
-            for child in element:
-                local = _localname(child.tag)
-                text = (child.text or "").strip()
-                if local == "FullName" and text:
-                    full_name = text
-                elif local == "Name" and text:
-                    name = text
-                elif local == "ListID" and text:
-                    list_id = text
-                elif local == "EditSequence" and text:
-                    edit_sequence = text
-                elif local == "IsActive":
-                    parsed_bool = _parse_bool(text)
-                    if parsed_bool is not None:
-                        is_active = parsed_bool
-                elif local == "QuantityOnHand":
-                    parsed_float = _parse_float(text)
-                    if parsed_float is not None:
-                        quantity_on_hand = parsed_float
-                elif local == "SalesPrice":
-                    parsed_float = _parse_float(text)
-                    if parsed_float is not None:
-                        sales_price = parsed_float
-                elif local == "PurchaseCost":
-                    parsed_float = _parse_float(text)
-                    if parsed_float is not None:
-                        purchase_cost = parsed_float
-                elif local == "IncomeAccountRef":
-                    income_account_full_name = _extract_ref_full_name(child)
-                elif local == "COGSAccountRef":
-                    cogs_account_full_name = _extract_ref_full_name(child)
-                elif local == "AssetAccountRef":
-                    asset_account_full_name = _extract_ref_full_name(child)
+        # In fallback mode, ItemQueryRs may include many item types; the path
+        # filter skips the non-inventory ones without a Python-level tag check.
+        for element in query_rs.iterfind(_ITEM_INVENTORY_RET_PATH):
+            findtext = element.findtext
+            full_name = (findtext("FullName") or "").strip()
+            name = (findtext("Name") or "").strip()
+            list_id = (findtext("ListID") or "").strip()
+            edit_sequence = (findtext("EditSequence") or "").strip()
+            is_active = _parse_bool(findtext("IsActive") or "")
+            quantity_on_hand = _parse_float(findtext("QuantityOnHand") or "")
+            sales_price = _parse_float(findtext("SalesPrice") or "")
+            purchase_cost = _parse_float(findtext("PurchaseCost") or "")
+            income_account_full_name = (findtext("IncomeAccountRef/FullName") or "").strip()
+            cogs_account_full_name = (findtext("COGSAccountRef/FullName") or "").strip()
+            asset_account_full_name = (findtext("AssetAccountRef/FullName") or "").strip()
 
             if full_name:
                 _add_item_key_variants(keys, full_name)
@@ -640,26 +888,64 @@ class QbwcService:
     def _persist_qb_items_cache_file(self) -> None:
         """
         Persist the latest QB item cache for downstream scripts.
+        The cache is snapshotted here and written on the persistence worker,
+        keeping disk I/O off the QBWC response path.
         """
+        self._qb_items_cache_dirty = False
+        self._qb_items_cache_last_persist = time.monotonic()
         if not self._cached_qb_inventory_part_names:
             return
+        snapshot = (
+            tuple(self._cached_qb_inventory_part_names),
+            tuple(self._cached_qb_inventory_part_details.values()),
+        )
+        with self._persist_lock:
+            self._persist_snapshot = snapshot
+            if self._persist_scheduled:
+                return
+            self._persist_scheduled = True
+        self._persist_executor.submit(self._drain_qb_items_cache_writes)
+
+    def _drain_qb_items_cache_writes(self) -> None:
+        while True:
+            with self._persist_lock:
+                snapshot = self._persist_snapshot
+                self._persist_snapshot = None
+                if snapshot is None:
+                    self._persist_scheduled = False
+                    return
+            self._write_qb_items_cache_files(*snapshot)
+
+    def _write_qb_items_cache_files(
+        self,
+        names: tuple[str, ...],
+        details: tuple[dict[str, Any], ...],
+    ) -> None:
         try:
-            tmp_dir = Path(".tmp")
-            tmp_dir.mkdir(parents=True, exist_ok=True)
-            csv_path = tmp_dir / "qb_items_live_from_qbwc.csv"
-            names = sorted(self._cached_qb_inventory_part_names)
-            with csv_path.open("w", encoding="utf-8", newline="") as outfile:
-                writer = csv.writer(outfile)
-                writer.writerow(["Sku", "Type"])
-                for name in names:
-                    writer.writerow([name, "Inventory Part"])
-
-            detail_path = tmp_dir / "qb_items_live_detail_from_qbwc.csv"
-            details = sorted(
-                self._cached_qb_inventory_part_details.values(),
+            self._ensure_tmp_dir()
+            name_set = frozenset(names)
+            if name_set != self._persisted_qb_item_names:
+                with self._qb_items_cache_path.open(
+                    "w",
+                    encoding="utf-8",
+                    newline="",
+                    buffering=1 << 20,
+                ) as outfile:
+                    writer = csv.writer(outfile)
+                    writer.writerow(("Sku", "Type"))
+                    writer.writerows((name, "Inventory Part") for name in sorted(names))
+                self._persisted_qb_item_names = name_set
+
+            sorted_details = sorted(
+                details,
                 key=lambda row: str(row.get("qbItemFullName") or "").casefold(),
             )
-            with detail_path.open("w", encoding="utf-8", newline="") as outfile:
+            with self._qb_items_detail_cache_path.open(
+                "w",
+                encoding="utf-8",
+                newline="",
+                buffering=1 << 20,
+            ) as outfile:
                 fieldnames = [
                     "qbItemFullName",
                     "qbItemName",
@@ -675,17 +961,33 @@ class QbwcService:
                 ]
                 writer = csv.DictWriter(outfile, fieldnames=fieldnames)
                 writer.writeheader()
-                for row in details:
-                    writer.writerow(
-                        {
-                            key: row.get(key)
-                            for key in fieldnames
-                        }
-                    )
+                writer.writerows(
+                    {
+                        key: row.get(key)
+                        for key in fieldnames
+                    }
+                    for row in sorted_details
+                )
         except Exception:
             # Never fail sync flow because cache debug files cannot be written.
+            # Re-check the directory next time in case it was removed underneath us.
+            self._tmp_dir_ensured = False
             return
 
+    def _flush_qb_items_cache_file(self) -> None:
+        if self._qb_items_cache_dirty:
+            self._persist_qb_items_cache_file()
+
+    def shutdown(self) -> None:
+        """
+        Flush buffered event results and pending cache changes, then wait for
+        queued cache writes to finish.
+        """
+        for session in list(self.sessions.values()):
+            self._release_qb_results(session, reason="service shutdown")
+        self._flush_qb_items_cache_file()
+        self._persist_executor.shutdown(wait=True)
+
     def qb_items_snapshot(self, *, include_details: bool = False) -> dict[str, Any]:
         names = sorted(self._cached_qb_inventory_part_names)
         snapshot = {
@@ -718,6 +1020,8 @@ class QbwcService:
 
     def _clear_pending_event_state(self, session: SessionState) -> None:
         session.pending_event = None
+        session.pending_event_id = None
+        session.pending_event_txn_type = None
         session.pending_event_original_line_count = 0
         session.pending_event_dropped_line_count = 0
         session.pending_account_create_queue = []
@@ -726,15 +1030,45 @@ class QbwcService:
         session.in_flight_item_create = None
         session.pending_missing_account_attempt_keys = []
 
+    def _reset_session_for_next_cycle(self, session: SessionState) -> None:
+        """
+        Combined _reset_in_flight_request_state + _clear_pending_event_state.
+        """
+        session.in_flight_event_id = None
+        session.in_flight_txn_type = None
+        session.in_flight_request_kind = ""
+        session.last_request_xml = ""
+        session.in_flight_account_create = None
+        session.in_flight_item_create = None
+        session.pending_event = None
+        session.pending_event_id = None
+        session.pending_event_txn_type = None
+        session.pending_event_original_line_count = 0
+        session.pending_event_dropped_line_count = 0
+        session.pending_account_create_queue = []
+        session.pending_item_create_queue = []
+        session.pending_missing_account_attempt_keys = []
+
     def _cache_created_item_name(self, item_full_name: str) -> None:
         clean_name = item_full_name.strip()
         if not clean_name:
             return
-        _add_item_key_variants(self._cached_qb_inventory_part_keys, clean_name)
+        keys = self._cached_qb_inventory_part_keys
+        if isinstance(keys, frozenset):
+            # Thaw once; later creates in this cycle add to the same set.
+            keys = set(keys)
+            self._cached_qb_inventory_part_keys = keys
+        _add_item_key_variants(keys, clean_name)
+        self._qb_items_cache_generation += 1
         self._cached_qb_inventory_part_names.add(clean_name)
         self._cached_qb_items_loaded_at_monotonic = time.monotonic()
         self._cached_qb_items_loaded_at_epoch_ms = int(time.time() * 1000)
-        self._persist_qb_items_cache_file()
+        self._qb_items_cache_dirty = True
+        if (
+            time.monotonic() - self._qb_items_cache_last_persist
+            > _QB_ITEMS_CACHE_PERSIST_INTERVAL_SECONDS
+        ):
+            self._persist_qb_items_cache_file()
 
     def _cache_known_account_name(self, session: SessionState, account_full_name: str) -> None:
         key = _normalize_account_key(account_full_name)
@@ -762,7 +1096,7 @@ class QbwcService:
             for spec in session.pending_account_create_queue
         }
         in_flight_account = _optional_text(
-            (session.in_flight_account_create or {}).get("accountFullName")
+            (session.in_flight_account_create or _EMPTY_MAPPING).get("accountFullName")
         )
         if in_flight_account:
             pending_keys.add(_normalize_account_key(in_flight_account))
@@ -784,7 +1118,7 @@ class QbwcService:
             specs.append(
                 {
                     "eventId": event_id,
-                    "requestId": str(uuid.uuid5(uuid.NAMESPACE_URL, request_seed)),
+                    "requestId": _uuid5_url(request_seed),
                     "accountFullName": full_name,
                     "accountType": account_type,
                     "isActive": True,
@@ -807,15 +1141,15 @@ class QbwcService:
 
         income_account = (
             _optional_text(line.get("itemIncomeAccountFullName"))
-            or self.config.qb_item_income_account_default
+            or self.config.qb_item_income_account_default.strip()
         )
         cogs_account = (
             _optional_text(line.get("itemCogsAccountFullName"))
-            or self.config.qb_item_cogs_account_default
+            or self.config.qb_item_cogs_account_default.strip()
         )
         asset_account = (
             _optional_text(line.get("itemAssetAccountFullName"))
-            or self.config.qb_item_asset_account_default
+            or self.config.qb_item_asset_account_default.strip()
         )
 
         missing_fields: list[str] = []
@@ -835,7 +1169,7 @@ class QbwcService:
         if not event_id:
             raise ValueError("Cannot auto-create missing item for an event without eventId.")
         request_seed = f"{event_id}|item_add|{item_full_name.casefold()}|{ordinal}"
-        request_id = str(uuid.uuid5(uuid.NAMESPACE_URL, request_seed))
+        request_id = _uuid5_url(request_seed)
         sales_description = (
             _optional_text(line.get("itemSalesDescription"))
             or _optional_text(line.get("sku"))
@@ -874,18 +1208,19 @@ class QbwcService:
             raise ValueError("Pending event is required before creating missing accounts.")
 
         create_spec = session.pending_account_create_queue.pop(0)
-        event_id = _optional_text(session.pending_event.get("eventId"))
+        event_id = session.pending_event_id
         if not event_id:
             raise ValueError("Pending event is missing eventId.")
+        account_full_name = _optional_text(create_spec.get("accountFullName"))
         qbxml_request = build_account_add_qbxml(
-            account_full_name=_optional_text(create_spec.get("accountFullName")),
+            account_full_name=account_full_name,
             account_type=_optional_text(create_spec.get("accountType")),
             request_id=_optional_text(create_spec.get("requestId")),
             qbxml_version=qbxml_version,
             is_active=create_spec.get("isActive"),
         )
         session.in_flight_event_id = event_id
-        session.in_flight_txn_type = _optional_text(session.pending_event.get("qbTxnType")) or None
+        session.in_flight_txn_type = session.pending_event_txn_type
         session.in_flight_request_kind = "account_create"
         session.last_request_xml = qbxml_request
         session.in_flight_account_create = create_spec
@@ -901,7 +1236,7 @@ class QbwcService:
             sent_line_count=1,
             dropped_line_count=session.pending_event_dropped_line_count,
             request_kind="account_create",
-            item_full_name=_optional_text(create_spec.get("accountFullName")),
+            item_full_name=account_full_name,
         )
         session.last_error = ""
         return qbxml_request
@@ -920,24 +1255,28 @@ class QbwcService:
             raise ValueError("Pending event is required before creating missing items.")
 
         create_spec = session.pending_item_create_queue.pop(0)
-        event_id = _optional_text(session.pending_event.get("eventId"))
+        event_id = session.pending_event_id
         if not event_id:
             raise ValueError("Pending event is missing eventId.")
+        # Specs come from _build_missing_item_create_spec, which already
+        # normalizes every text field.
+        get = create_spec.get
+        item_full_name = get("itemFullName")
         qbxml_request = build_item_inventory_add_qbxml(
-            item_full_name=_optional_text(create_spec.get("itemFullName")),
-            request_id=_optional_text(create_spec.get("requestId")),
+            item_full_name=item_full_name,
+            request_id=get("requestId"),
             qbxml_version=qbxml_version,
-            income_account_full_name=_optional_text(create_spec.get("incomeAccountFullName")),
-            cogs_account_full_name=_optional_text(create_spec.get("cogsAccountFullName")),
-            asset_account_full_name=_optional_text(create_spec.get("assetAccountFullName")),
-            sales_desc=_optional_text(create_spec.get("salesDesc")),
-            purchase_desc=_optional_text(create_spec.get("purchaseDesc")),
-            sales_price=create_spec.get("salesPrice"),
-            purchase_cost=create_spec.get("purchaseCost"),
-            is_active=create_spec.get("isActive"),
+            income_account_full_name=get("incomeAccountFullName"),
+            cogs_account_full_name=get("cogsAccountFullName"),
+            asset_account_full_name=get("assetAccountFullName"),
+            sales_desc=get("salesDesc"),
+            purchase_desc=get("purchaseDesc"),
+            sales_price=get("salesPrice"),
+            purchase_cost=get("purchaseCost"),
+            is_active=get("isActive"),
         )
         session.in_flight_event_id = event_id
-        session.in_flight_txn_type = _optional_text(session.pending_event.get("qbTxnType")) or None
+        session.in_flight_txn_type = session.pending_event_txn_type
         session.in_flight_request_kind = "item_create"
         session.last_request_xml = qbxml_request
         session.in_flight_item_create = create_spec
@@ -952,7 +1291,7 @@ class QbwcService:
             sent_line_count=1,
             dropped_line_count=session.pending_event_dropped_line_count,
             request_kind="item_create",
-            item_full_name=_optional_text(create_spec.get("itemFullName")),
+            item_full_name=item_full_name,
         )
         session.last_error = ""
         return qbxml_request
@@ -993,7 +1332,7 @@ class QbwcService:
         *,
         qbxml_version: str,
     ) -> tuple[str, int]:
-        lines = event.get("lines", [])
+        lines = event.get("lines") or _EMPTY_TUPLE
         if not isinstance(lines, list) or not lines:
             raise ValueError("Item account sync event has no lines.")
 
@@ -1038,7 +1377,7 @@ class QbwcService:
             event_id = _optional_text(event.get("eventId")) or "item_account_sync"
             sku_key = _optional_text(line.get("sku")) or _optional_text(detail.get("qbItemFullName")) or str(index)
             request_seed = f"{event_id}|item_mod|{sku_key.casefold()}|{index}"
-            request_id = str(uuid.uuid5(uuid.NAMESPACE_URL, request_seed))
+            request_id = _uuid5_url(request_seed)
 
             mods.append(
                 {
@@ -1064,7 +1403,7 @@ class QbwcService:
         missing_account_full_name: str,
         attempt_keys: list[str],
     ) -> dict[str, Any] | None:
-        lines = event.get("lines", [])
+        lines = event.get("lines") or _EMPTY_TUPLE
         if not isinstance(lines, list) or not lines:
             return None
 
@@ -1123,7 +1462,7 @@ class QbwcService:
         event_id = _optional_text(event.get("eventId"))
         if not event_id:
             raise ValueError("Cannot build event request without eventId.")
-        lines = event.get("lines", [])
+        lines = event.get("lines") or _EMPTY_TUPLE
         if not isinstance(lines, list) or not lines:
             raise ValueError(f"Event {event_id} has no lines to send.")
 
@@ -1144,11 +1483,10 @@ class QbwcService:
 
         session.in_flight_event_id = event_id
         if request_kind == "item_account_sync":
-            if (
-                session.pending_event is None
-                or _optional_text(session.pending_event.get("eventId")) != event_id
-            ):
+            if session.pending_event is None or session.pending_event_id != event_id:
                 session.pending_event = dict(event)
+                session.pending_event_id = event_id
+                session.pending_event_txn_type = _optional_text(event.get("qbTxnType")) or None
                 session.pending_event_original_line_count = original_line_count
                 session.pending_event_dropped_line_count = dropped_line_count
                 session.pending_missing_account_attempt_keys = []
@@ -1189,12 +1527,13 @@ class QbwcService:
         request_kind: str,
         item_full_name: str = "",
     ) -> None:
+        if not self.config.debug_persist_requests:
+            return
         try:
-            tmp_dir = Path(".tmp")
-            tmp_dir.mkdir(parents=True, exist_ok=True)
-            (tmp_dir / "last_send_request_payload.xml").write_text(payload, encoding="utf-8")
-            (tmp_dir / "last_send_request_meta.json").write_text(
-                json.dumps(
+            self._ensure_tmp_dir()
+            self._last_request_payload_path.write_bytes(payload.encode("utf-8"))
+            self._last_request_meta_path.write_bytes(
+                _encode_debug_json(
                     {
                         "ticket": ticket,
                         "eventId": event_id,
@@ -1206,17 +1545,16 @@ class QbwcService:
                         "originalLineCount": original_line_count,
                         "sentLineCount": sent_line_count,
                         "droppedLineCount": dropped_line_count,
-                    },
-                    indent=2,
+                    }
                 )
-                + "\n",
-                encoding="utf-8",
             )
         except Exception:
             # Never fail sync flow because local debug files cannot be written.
+            # Re-check the directory next time in case it was removed underneath us.
+            self._tmp_dir_ensured = False
             return
 
-    def _load_qb_inventory_part_keys(self) -> set[str]:
+    def _load_qb_inventory_part_keys(self) -> set[str] | frozenset[str]:
         if self._qbwc_items_mode_enabled():
             if self._cached_qb_inventory_part_keys:
                 return self._cached_qb_inventory_part_keys
@@ -1224,84 +1562,135 @@ class QbwcService:
                 "QB item cache is empty in qbwc mode. Wait for ItemInventoryQuery to complete."
             )
 
-        csv_path = Path(self.config.qb_items_csv).expanduser()
+        csv_path = self._qb_items_csv_path
+        raw_path = self._qb_items_csv_path_str
         try:
-            resolved_path = str(csv_path.resolve())
+            # stat() follows symlinks, so a retargeted link still changes mtime;
+            # no realpath resolution is needed to key the cache.
             stat = csv_path.stat()
         except OSError as exc:
             raise ValueError(
                 f"QB items CSV is not readable: {csv_path}"
             ) from exc
 
-        if (
-            self._cached_qb_items_path == resolved_path
-            and self._cached_qb_items_mtime_ns == stat.st_mtime_ns
-            and self._cached_qb_inventory_part_keys
-        ):
+        same_file = (
+            self._cached_qb_items_path == raw_path
+            and self._cached_qb_items_size == stat.st_size
+            and bool(self._cached_qb_inventory_part_keys)
+        )
+        if same_file and self._cached_qb_items_mtime_ns == stat.st_mtime_ns:
             return self._cached_qb_inventory_part_keys
 
+        # Same size but a new mtime: the file may only have been touched (editor
+        # save, checkout, copy), so compare content before re-parsing it. A size
+        # change always re-parses, so the hash is only computed here; after such
+        # a load it stays empty until the next same-size check stores it.
+        content_sha1 = ""
+        if same_file:
+            content_sha1 = _file_sha1(csv_path)
+            if content_sha1 == self._cached_qb_items_sha1:
+                self._cached_qb_items_mtime_ns = stat.st_mtime_ns
+                return self._cached_qb_inventory_part_keys
+
         with csv_path.open("r", encoding="utf-8-sig", newline="") as infile:
-            reader = csv.DictReader(infile)
-            headers = list(reader.fieldnames or [])
+            reader = csv.reader(infile)
+            headers = tuple(next(reader, ()))
             if not headers:
                 raise ValueError(f"QB items CSV has no headers: {csv_path}")
 
-            type_col = _resolve_csv_column(headers, _TYPE_COLUMN_CANDIDATES, "item type")
-            sku_col = _resolve_csv_column(headers, _SKU_COLUMN_CANDIDATES, "sku")
+            header_map = _build_header_map(headers)
+            type_col = _resolve_csv_column(header_map, _TYPE_COLUMN_CANDIDATES, "item type")
+            sku_col = _resolve_csv_column(header_map, _SKU_COLUMN_CANDIDATES, "sku")
+            type_idx = headers.index(type_col)
+            sku_idx = headers.index(sku_col)
+            min_row_len = max(type_idx, sku_idx) + 1
+
+            columns = _read_csv_columns_with_arrow(csv_path, type_col, sku_col)
+            if columns is None:
+                columns = (
+                    (row[type_idx], row[sku_idx])
+                    for row in reader
+                    # Ragged rows (short trailing cells) cannot carry both columns.
+                    if len(row) >= min_row_len
+                )
 
-            keys: set[str] = set()
+            # Collected as a list and frozen once below, so the hash table is
+            # sized in one pass instead of growing row by row.
+            key_list: list[str] = []
+            add_key = key_list.append
             names: set[str] = set()
-            for row in reader:
-                item_type = str(row.get(type_col) or "").strip()
-                if not _is_inventory_part(item_type):
+            # QB exports repeat a handful of Type values, so classify each once.
+            type_is_part: dict[str, bool] = {}
+            for raw_type, raw_sku in columns:
+                is_part = type_is_part.get(raw_type)
+                if is_part is None:
+                    is_part = type_is_part[raw_type] = _is_inventory_part(raw_type)
+                if not is_part:
                     continue
 
-                sku = str(row.get(sku_col) or "").strip()
+                sku = raw_sku.strip()
                 if not sku:
                     continue
 
-                _add_item_key_variants(keys, sku)
+                # Inline _add_item_key_variants: sku is already stripped, so
+                # fold it directly and split the leaf with one rpartition.
+                add_key(_fold_item_key(sku))
+                _, sep, leaf = sku.rpartition(":")
+                if sep:
+                    leaf = leaf.strip()
+                    if leaf:
+                        add_key(_fold_item_key(leaf))
                 names.add(sku)
 
-        if not keys:
+        if not key_list:
             raise ValueError(
                 f"QB items CSV contains no Inventory Part SKUs: {csv_path}"
             )
 
-        self._cached_qb_items_path = resolved_path
+        self._cached_qb_items_path = raw_path
         self._cached_qb_items_mtime_ns = stat.st_mtime_ns
-        self._cached_qb_inventory_part_keys = keys
+        self._cached_qb_items_size = stat.st_size
+        self._cached_qb_items_sha1 = content_sha1
+        frozen_keys = frozenset(key_list)
+        self._cached_qb_inventory_part_keys = frozen_keys
+        self._qb_items_cache_generation += 1
         self._cached_qb_inventory_part_names = names
         self._cached_qb_inventory_part_details = {}
         self._cached_qb_inventory_part_detail_lookup = {}
         self._cached_qb_items_loaded_at_monotonic = time.monotonic()
         self._cached_qb_items_loaded_at_epoch_ms = int(time.time() * 1000)
-        return keys
+        return frozen_keys
 
     def _filter_event_lines_to_qb_items(
         self,
         event: dict[str, Any],
     ) -> tuple[dict[str, Any], int, int, list[dict[str, Any]]]:
-        inventory_part_keys = self._load_qb_inventory_part_keys()
         lines = event.get("lines", [])
-        if not isinstance(lines, list):
-            return dict(event), 0, 0, []
+        # Nothing to match: skip loading (or re-validating) the item catalog.
+        if not lines or not isinstance(lines, list):
+            return event, 0, 0, []
+        inventory_part_keys = self._load_qb_inventory_part_keys()
 
         filtered_lines: list[dict[str, Any]] = []
         missing_lines_for_auto_create: list[dict[str, Any]] = []
         auto_create = self.config.qb_items_auto_create
-        for line in lines:
-            if not isinstance(line, dict):
-                continue
-            candidates = _line_item_candidates(line)
-            if not candidates:
-                continue
-            if any(candidate in inventory_part_keys for candidate in candidates):
-                filtered_lines.append(line)
-                continue
-            if auto_create:
+        if auto_create:
+            # Every line with an item reference is kept; unknown items are queued for creation.
+            for line in lines:
+                if not isinstance(line, dict):
+                    continue
+                matched = _line_matches(line, inventory_part_keys)
+                if matched is None:
+                    continue
                 filtered_lines.append(line)
-                missing_lines_for_auto_create.append(line)
+                if not matched:
+                    missing_lines_for_auto_create.append(line)
+        else:
+            for line in lines:
+                if not isinstance(line, dict):
+                    continue
+                if _line_matches(line, inventory_part_keys):
+                    filtered_lines.append(line)
 
         missing_item_creates: list[dict[str, Any]] = []
         if auto_create and missing_lines_for_auto_create:
@@ -1322,26 +1711,212 @@ class QbwcService:
                 )
                 ordinal += 1
 
-        filtered_event = dict(event)
-        filtered_event["lines"] = filtered_lines
+        # Events are fresh per Convex fetch and only read after filtering, so
+        # swap the lines in place rather than copying the whole event dict.
+        event["lines"] = filtered_lines
         original_count = len(lines)
         sent_count = len(filtered_lines)
         dropped_count = max(original_count - sent_count, 0)
-        return filtered_event, original_count, dropped_count, missing_item_creates
+        return event, original_count, dropped_count, missing_item_creates
+
+    def _refill_local_event_queue(self, session: SessionState) -> None:
+        self._flush_qb_results(session, force=True)
+        session.local_event_queue.clear()
+        lookahead_ms = max(self.config.qb_retry_lookahead_seconds, 0) * 1000
+        now_ms = int(time.time() * 1000) + lookahead_ms
+        payload = self.convex.get_next_pending_event(
+            limit=_PENDING_EVENT_FETCH_LIMIT, now_ms=now_ms
+        )
+        # The Convex client drops events without an id and guarantees str ids.
+        events = payload.get("events") or _EMPTY_TUPLE
+        if not events:
+            return
+        session.local_event_queue_fetched_at = time.monotonic()
+
+        # Filter every fetched event up front, with no Convex I/O in between;
+        # sendRequestXML then only dispatches the prepared results. Events are
+        # not claimed here: _claim_event marks each one in flight only when it
+        # is sent, so a session that ends early strands nothing in Convex.
+        # Events that filter down to nothing (or fail to build) are settled
+        # by results that ride along with that claim.
+        # A result still waiting for delivery already settles its event.
+        undelivered_ids = {result["eventId"] for result in session.pending_results}
+        for event in events:
+            event_id = event["eventId"]
+            if event_id in undelivered_ids:
+                continue
+            original_lines = event.get("lines")
+            try:
+                prepared = self._filter_event_lines_to_qb_items(event)
+            except Exception as exc:
+                self._queue_qb_result(
+                    session,
+                    event_id,
+                    claimed=False,
+                    success=False,
+                    qb_txn_type=event.get("qbTxnType"),
+                    qb_error_code="BUILD_ERROR",
+                    qb_error_message=f"sendRequestXML build error: {exc}",
+                    retryable=False,
+                )
+                session.last_error = f"sendRequestXML build error for event {event_id}: {exc}"
+                continue
+            if not prepared[0].get("lines"):
+                self._queue_qb_result(
+                    session,
+                    event_id,
+                    claimed=False,
+                    success=True,
+                    qb_txn_type=event.get("qbTxnType"),
+                )
+                continue
+            # Read after filtering: the first filter call may (re)load the catalog.
+            session.local_event_queue.append(
+                (
+                    event_id,
+                    event,
+                    original_lines,
+                    self._qb_items_cache_generation,
+                    prepared,
+                )
+            )
 
-    def _qbwc_progress_percent(self) -> int:
+    def _claim_event(self, session: SessionState, event_id: str) -> bool:
         """
-        Return QBWC progress for receiveResponseXML.
-        QBWC continues polling sendRequestXML while this is < 100.
+        Mark the event about to be sent as in flight.
+        Buffered results (up to one flush batch) ride along in the same call.
+        """
+        batch = session.pending_results[:_QB_RESULT_FLUSH_BATCH_SIZE]
+        claimed = self.convex.claim_event(event_id, session.ticket, batch)
+        del session.pending_results[: len(batch)]
+        if not session.pending_results:
+            session.pending_results_claimed = False
+        self._record_rejected_qb_results(batch, claimed)
+        # The pending set just changed; force the next progress check to re-poll.
+        self._has_pending_cache = None
+        return bool(claimed.get("claimed"))
+
+    def _queue_qb_result(
+        self,
+        session: SessionState,
+        event_id: str,
+        *,
+        claimed: bool = True,
+        **kwargs: Any,
+    ) -> None:
+        session.pending_results.append(
+            build_qb_result_payload(event_id, session.ticket, **kwargs)
+        )
+        if claimed:
+            session.pending_results_claimed = True
+
+    def _flush_qb_results(self, session: SessionState, *, force: bool = False) -> None:
+        """
+        Send buffered event results to Convex, one mutation per batch.
+        Unless forced, results for events that were never claimed (settled
+        before sending) are held while the local queue still has events and the
+        batch is below _QB_RESULT_FLUSH_BATCH_SIZE; they then ride along with
+        the next claim. A result for a claimed event is never held: that event
+        is in flight in Convex until the result lands.
+        """
+        pending = session.pending_results
+        if not pending:
+            return
+        if (
+            not force
+            and not session.pending_results_claimed
+            and session.local_event_queue
+            and len(pending) < _QB_RESULT_FLUSH_BATCH_SIZE
+        ):
+            return
+        # Chunked so a long backlog never becomes one oversized CLI argument.
+        while pending:
+            batch = pending[:_QB_RESULT_FLUSH_BATCH_SIZE]
+            if not self._safe_apply_qb_results(batch):
+                # Keep them, in order, for the next flush.
+                return
+            del pending[: len(batch)]
+        session.pending_results_claimed = False
+
+    def _release_qb_results(self, session: SessionState, *, reason: str) -> None:
+        """
+        Final flush for a session that is going away; whatever Convex still
+        refuses is recorded instead of being dropped with the session.
+        """
+        self._flush_qb_results(session, force=True)
+        if session.pending_results:
+            self._record_undelivered_qb_results(session.pending_results, reason)
+            session.pending_results = []
+            session.pending_results_claimed = False
+
+    def _safe_apply_qb_results(self, results: list[dict[str, Any]]) -> bool:
+        """
+        Single sink for Convex result writes; never lets a failure escape into the QBWC flow.
         """
         try:
-            lookahead_ms = max(self.config.qb_retry_lookahead_seconds, 0) * 1000
-            now_ms = int(time.time() * 1000) + lookahead_ms
-            payload = self.convex.get_next_pending_event(limit=1, now_ms=now_ms)
-            events = payload.get("events", [])
-            return 0 if events else 100
+            response = self.convex.apply_qb_results(results)
         except Exception:
-            return 100
+            return False
+        self._record_rejected_qb_results(results, response)
+        return True
+
+    def _record_rejected_qb_results(
+        self,
+        results: list[dict[str, Any]],
+        response: Mapping[str, Any],
+    ) -> None:
+        failed = response.get("failed") or _EMPTY_TUPLE
+        if not failed:
+            return
+        by_event_id = {result["eventId"]: result for result in results}
+        for entry in failed:
+            result = by_event_id.get(entry.get("eventId"))
+            if result is not None:
+                self._record_undelivered_qb_results(
+                    [result], f"rejected by Convex: {entry.get('error') or 'unknown error'}"
+                )
+
+    def _record_undelivered_qb_results(
+        self,
+        results: list[dict[str, Any]],
+        reason: str,
+    ) -> None:
+        recorded_at = int(time.time() * 1000)
+        lines = b"".join(
+            _encode_debug_json(
+                {"recordedAtEpochMs": recorded_at, "reason": reason, "result": result}
+            )
+            for result in results
+        )
+        try:
+            self._ensure_tmp_dir()
+            with self._undelivered_results_path.open("ab") as outfile:
+                outfile.write(lines)
+        except OSError:
+            self._tmp_dir_ensured = False
+
+    def _qbwc_progress_percent(self, session: SessionState) -> int:
+        """
+        Return QBWC progress for receiveResponseXML.
+        QBWC continues polling sendRequestXML while this is < 100.
+        """
+        if session.local_event_queue:
+            return 0
+        now = time.monotonic()
+        cached = self._has_pending_cache
+        if cached is not None and now - cached[0] < _PENDING_EVENTS_CACHE_TTL_SECONDS:
+            progress = 0 if cached[1] else 100
+        else:
+            try:
+                lookahead_ms = max(self.config.qb_retry_lookahead_seconds, 0) * 1000
+                now_ms = int(time.time() * 1000) + lookahead_ms
+                payload = self.convex.get_next_pending_event(limit=1, now_ms=now_ms)
+                events = payload.get("events") or _EMPTY_TUPLE
+            except Exception:
+                return 100
+            self._has_pending_cache = (now, bool(events))
+            progress = 0 if events else 100
+        return progress
 
     def server_version(self) -> str:
         return self.config.server_version
@@ -1367,7 +1942,7 @@ class QbwcService:
             return ["nvu", ""]
 
         ticket = str(uuid.uuid4())
-        self.sessions[ticket] = SessionState(ticket=ticket)
+        self._store_session(SessionState(ticket=ticket))
         return [ticket, self.config.qb_company_file or ""]
 
     def send_request_xml(
@@ -1402,9 +1977,7 @@ class QbwcService:
                 or session.pending_item_create_queue
                 or session.pending_event
             ):
-                pending_event_id = _optional_text(
-                    (session.pending_event or {}).get("eventId")
-                )
+                pending_event_id = session.pending_event_id or ""
                 try:
                     if session.pending_account_create_queue:
                         return self._send_next_account_create_request(
@@ -1432,62 +2005,92 @@ class QbwcService:
                         )
                 except Exception as exc:
                     if pending_event_id:
-                        try:
-                            self.convex.apply_qb_result(
-                                event_id=pending_event_id,
-                                ticket=session.ticket,
-                                success=False,
-                                qb_txn_type=session.in_flight_txn_type
-                                or _optional_text(
-                                    (session.pending_event or {}).get("qbTxnType")
-                                )
-                                or None,
-                                qb_error_code="BUILD_ERROR",
-                                qb_error_message=f"sendRequestXML build error: {exc}",
-                                retryable=False,
-                            )
-                        except Exception:
-                            pass
-                    self._clear_pending_event_state(session)
-                    self._reset_in_flight_request_state(session)
+                        self._queue_qb_result(
+                            session,
+                            pending_event_id,
+                            success=False,
+                            qb_txn_type=session.in_flight_txn_type
+                            or session.pending_event_txn_type,
+                            qb_error_code="BUILD_ERROR",
+                            qb_error_message=f"sendRequestXML build error: {exc}",
+                            retryable=False,
+                        )
+                    self._reset_session_for_next_cycle(session)
+                    self._flush_qb_results(session, force=True)
                     session.last_error = f"sendRequestXML build error for event {pending_event_id}: {exc}"
                     return ""
 
-            lookahead_ms = max(self.config.qb_retry_lookahead_seconds, 0) * 1000
-            now_ms = int(time.time() * 1000) + lookahead_ms
-            payload = self.convex.get_next_pending_event(limit=10, now_ms=now_ms)
-            events = payload.get("events", [])
-            if not events:
+            if (
+                not session.local_event_queue
+                or time.monotonic() - session.local_event_queue_fetched_at
+                > _LOCAL_EVENT_QUEUE_MAX_AGE_SECONDS
+            ):
+                self._refill_local_event_queue(session)
+            if not session.local_event_queue:
+                self._flush_qb_results(session, force=True)
                 self._reset_in_flight_request_state(session)
                 return ""
 
-            for event in events:
-                event_id = str(event.get("eventId") or "")
-                if not event_id:
-                    continue
+            while session.local_event_queue:
+                (
+                    event_id,
+                    event,
+                    original_lines,
+                    generation,
+                    prepared,
+                ) = session.local_event_queue.popleft()
                 try:
-                    self.convex.mark_event_in_flight(event_id, session.ticket)
+                    if generation != self._qb_items_cache_generation:
+                        # Known items changed since this event was prepared
+                        # (e.g. an earlier event auto-created them); filter again
+                        # from the original lines.
+                        if isinstance(original_lines, list):
+                            event["lines"] = original_lines
+                        prepared = self._filter_event_lines_to_qb_items(event)
                     (
                         filtered_event,
                         original_line_count,
                         dropped_line_count,
                         missing_item_creates,
-                    ) = (
-                        self._filter_event_lines_to_qb_items(event)
-                    )
-                    filtered_lines = filtered_event.get("lines", [])
+                    ) = prepared
+                    filtered_lines = filtered_event.get("lines") or _EMPTY_TUPLE
                     if not filtered_lines:
-                        self.convex.apply_qb_result(
-                            event_id=event_id,
-                            ticket=session.ticket,
+                        self._queue_qb_result(
+                            session,
+                            event_id,
+                            claimed=False,
                             success=True,
                             qb_txn_type=event.get("qbTxnType"),
                         )
                         session.last_error = ""
                         continue
+                except Exception as exc:
+                    self._queue_qb_result(
+                        session,
+                        event_id,
+                        claimed=False,
+                        success=False,
+                        qb_txn_type=event.get("qbTxnType"),
+                        qb_error_code="BUILD_ERROR",
+                        qb_error_message=f"sendRequestXML build error: {exc}",
+                        retryable=False,
+                    )
+                    session.last_error = f"sendRequestXML build error for event {event_id}: {exc}"
+                    continue
+
+                # Convex errors here propagate: the event is still pending there
+                # and is fetched again on the next poll.
+                if not self._claim_event(session, event_id):
+                    # Settled or claimed elsewhere since it was fetched.
+                    continue
 
+                try:
                     if missing_item_creates:
                         session.pending_event = filtered_event
+                        session.pending_event_id = event_id
+                        session.pending_event_txn_type = (
+                            _optional_text(filtered_event.get("qbTxnType")) or None
+                        )
                         session.pending_event_original_line_count = original_line_count
                         session.pending_event_dropped_line_count = dropped_line_count
                         session.pending_account_create_queue = []
@@ -1509,22 +2112,20 @@ class QbwcService:
                         dropped_line_count=dropped_line_count,
                     )
                 except Exception as exc:
-                    try:
-                        self.convex.apply_qb_result(
-                            event_id=event_id,
-                            ticket=session.ticket,
-                            success=False,
-                            qb_txn_type=event.get("qbTxnType"),
-                            qb_error_code="BUILD_ERROR",
-                            qb_error_message=f"sendRequestXML build error: {exc}",
-                            retryable=False,
-                        )
-                    except Exception:
-                        pass
+                    self._queue_qb_result(
+                        session,
+                        event_id,
+                        success=False,
+                        qb_txn_type=event.get("qbTxnType"),
+                        qb_error_code="BUILD_ERROR",
+                        qb_error_message=f"sendRequestXML build error: {exc}",
+                        retryable=False,
+                    )
                     self._clear_pending_event_state(session)
                     session.last_error = f"sendRequestXML build error for event {event_id}: {exc}"
                     continue
 
+            self._flush_qb_results(session, force=True)
             self._reset_in_flight_request_state(session)
             return ""
         except Exception as exc:
@@ -1540,272 +2141,309 @@ class QbwcService:
         message: str,
     ) -> int:
         session = self._session(ticket)
-        if session.in_flight_request_kind == "item_query":
-            try:
-                clean_hresult = (hresult or "").strip()
-                if clean_hresult:
-                    error_message = (message or "").strip() or "QuickBooks returned HResult failure."
-                    switched_to_fallback = False
-                    if (
-                        clean_hresult.casefold() == "0x80040400"
-                        and self._qb_items_query_request_mode != _QB_ITEMS_QUERY_MODE_FALLBACK
-                    ):
-                        self._qb_items_query_request_mode = _QB_ITEMS_QUERY_MODE_FALLBACK
-                        switched_to_fallback = True
-                        error_message = (
-                            f"{error_message} "
-                            "[Auto-fallback enabled: switching QB item pull to ItemQueryRq compatibility mode.]"
-                        )
-                    self._reset_qb_items_query_state()
-                    session.last_error = error_message
-                    if switched_to_fallback:
-                        # Keep QBWC polling in this cycle so we can immediately retry with fallback qbXML.
-                        return 0
-                    return self._qbwc_progress_percent()
-
-                page_keys, page_names, iterator_id, remaining_count = self._parse_item_inventory_query_response(
-                    response_xml or ""
-                )
-                self._qb_items_query_accumulator.update(page_keys)
-                self._qb_items_query_name_accumulator.update(page_names)
-
-                if remaining_count > 0:
-                    if not iterator_id:
-                        raise ValueError(
-                            "QuickBooks ItemInventoryQueryRs missing iteratorID while iteratorRemainingCount > 0."
-                        )
-                    self._qb_items_query_in_progress = True
-                    self._qb_items_query_iterator_id = iterator_id
-                    session.last_error = ""
-                    return 0
-
-                if not self._qb_items_query_accumulator:
-                    raise ValueError("QuickBooks ItemInventoryQuery returned zero inventory-part items.")
+        clean_hresult = hresult.strip() if hresult else ""
+        hresult_error_message = (
+            (message.strip() if message else "") or "QuickBooks returned HResult failure."
+            if clean_hresult
+            else ""
+        )
+        handler = self._response_handlers.get(
+            session.in_flight_request_kind, self._handle_event_response
+        )
+        return handler(session, response_xml, clean_hresult, hresult_error_message)
 
-                self._cached_qb_inventory_part_keys = set(self._qb_items_query_accumulator)
-                self._cached_qb_inventory_part_names = set(self._qb_items_query_name_accumulator)
-                self._cached_qb_inventory_part_details = dict(self._qb_items_query_detail_accumulator)
-                self._rebuild_qb_item_detail_lookup()
-                self._cached_qb_items_loaded_at_monotonic = time.monotonic()
-                self._cached_qb_items_loaded_at_epoch_ms = int(time.time() * 1000)
-                self._persist_qb_items_cache_file()
-                self._reset_qb_items_query_state()
-                session.last_error = ""
-                return self._qbwc_progress_percent()
-            except Exception as exc:
+    def _handle_item_query_response(
+        self,
+        session: SessionState,
+        response_xml: str,
+        clean_hresult: str,
+        hresult_error_message: str,
+    ) -> int:
+        try:
+            if clean_hresult:
+                error_message = hresult_error_message
+                switched_to_fallback = False
+                if (
+                    clean_hresult in _HRESULT_PARSE_ERROR_CODES
+                    and self._qb_items_query_request_mode != _QB_ITEMS_QUERY_MODE_FALLBACK
+                ):
+                    self._qb_items_query_request_mode = _QB_ITEMS_QUERY_MODE_FALLBACK
+                    switched_to_fallback = True
+                    error_message = (
+                        f"{error_message} "
+                        "[Auto-fallback enabled: switching QB item pull to ItemQueryRq compatibility mode.]"
+                    )
                 self._reset_qb_items_query_state()
-                session.last_error = f"receiveResponseXML item query error: {exc}"
-                return self._qbwc_progress_percent()
-            finally:
-                self._reset_in_flight_request_state(session)
+                session.last_error = error_message
+                if switched_to_fallback:
+                    # Keep QBWC polling in this cycle so we can immediately retry with fallback qbXML.
+                    return 0
+                return self._qbwc_progress_percent(session)
 
-        if session.in_flight_request_kind == "account_create":
-            event_id = (
-                session.in_flight_event_id
-                or _optional_text((session.pending_event or {}).get("eventId"))
+            page_keys, page_names, iterator_id, remaining_count = self._parse_item_inventory_query_response(
+                response_xml or ""
             )
-            account_full_name = _optional_text(
-                (session.in_flight_account_create or {}).get("accountFullName")
+            self._qb_items_query_accumulator = _merge_key_sets(
+                self._qb_items_query_accumulator, page_keys
+            )
+            self._qb_items_query_name_accumulator = _merge_key_sets(
+                self._qb_items_query_name_accumulator, page_names
             )
-            try:
-                if (hresult or "").strip():
-                    error_message = (message or "").strip() or "QuickBooks returned HResult failure."
-                    retryable = not _is_hresult_parse_error(hresult)
-                    if event_id:
-                        self.convex.apply_qb_result(
-                            event_id=event_id,
-                            ticket=session.ticket,
-                            success=False,
-                            qb_txn_type=session.in_flight_txn_type,
-                            qb_error_code=(hresult or "HRESULT_ERROR").strip(),
-                            qb_error_message=error_message,
-                            retryable=retryable,
-                        )
-                    self._clear_pending_event_state(session)
-                    session.last_error = error_message
-                    return self._qbwc_progress_percent()
-
-                parsed = parse_qbxml_response(response_xml or "")
-                if parsed.success or _is_duplicate_name_conflict(parsed.status_code):
-                    if account_full_name:
-                        self._cache_known_account_name(session, account_full_name)
-                    session.last_error = ""
-                    if (
-                        session.pending_account_create_queue
-                        or session.pending_item_create_queue
-                        or session.pending_event
-                    ):
-                        return 0
-                    return self._qbwc_progress_percent()
 
+            if remaining_count > 0:
+                if not iterator_id:
+                    raise ValueError(
+                        "QuickBooks ItemInventoryQueryRs missing iteratorID while iteratorRemainingCount > 0."
+                    )
+                self._qb_items_query_in_progress = True
+                self._qb_items_query_iterator_id = iterator_id
+                session.last_error = ""
+                return 0
+
+            if not self._qb_items_query_accumulator:
+                raise ValueError("QuickBooks ItemInventoryQuery returned zero inventory-part items.")
+
+            # Hand the accumulators over by reference; _reset_qb_items_query_state
+            # rebinds fresh containers for the next cycle instead of clearing these.
+            self._cached_qb_inventory_part_keys = self._qb_items_query_accumulator
+            self._qb_items_cache_generation += 1
+            self._cached_qb_inventory_part_names = self._qb_items_query_name_accumulator
+            self._cached_qb_inventory_part_details = self._qb_items_query_detail_accumulator
+            self._rebuild_qb_item_detail_lookup()
+            self._cached_qb_items_loaded_at_monotonic = time.monotonic()
+            self._cached_qb_items_loaded_at_epoch_ms = int(time.time() * 1000)
+            self._persist_qb_items_cache_file()
+            self._reset_qb_items_query_state()
+            session.last_error = ""
+            return self._qbwc_progress_percent(session)
+        except Exception as exc:
+            self._reset_qb_items_query_state()
+            session.last_error = f"receiveResponseXML item query error: {exc}"
+            return self._qbwc_progress_percent(session)
+        finally:
+            self._reset_in_flight_request_state(session)
+
+    def _handle_account_create_response(
+        self,
+        session: SessionState,
+        response_xml: str,
+        clean_hresult: str,
+        hresult_error_message: str,
+    ) -> int:
+        event_id = session.in_flight_event_id or session.pending_event_id or ""
+        account_full_name = _optional_text(
+            (session.in_flight_account_create or _EMPTY_MAPPING).get("accountFullName")
+        )
+        try:
+            if clean_hresult:
+                error_message = hresult_error_message
+                retryable = clean_hresult not in _HRESULT_PARSE_ERROR_CODES
                 if event_id:
-                    self.convex.apply_qb_result(
-                        event_id=event_id,
-                        ticket=session.ticket,
+                    self._queue_qb_result(
+                        session,
+                        event_id,
                         success=False,
                         qb_txn_type=session.in_flight_txn_type,
-                        qb_error_code=parsed.status_code,
-                        qb_error_message=parsed.status_message or "QuickBooks reported an error.",
+                        qb_error_code=clean_hresult,
+                        qb_error_message=error_message,
+                        retryable=retryable,
                     )
                 self._clear_pending_event_state(session)
-                session.last_error = parsed.status_message or "QuickBooks reported an error."
-                return self._qbwc_progress_percent()
-            except Exception as exc:
-                if event_id:
-                    try:
-                        self.convex.apply_qb_result(
-                            event_id=event_id,
-                            ticket=session.ticket,
-                            success=False,
-                            qb_txn_type=session.in_flight_txn_type,
-                            qb_error_code="ACCOUNT_CREATE_ERROR",
-                            qb_error_message=f"receiveResponseXML account create error: {exc}",
-                            retryable=True,
-                        )
-                    except Exception:
-                        pass
-                self._clear_pending_event_state(session)
-                session.last_error = f"receiveResponseXML account create error: {exc}"
-                return self._qbwc_progress_percent()
-            finally:
-                self._reset_in_flight_request_state(session)
+                session.last_error = error_message
+                return self._qbwc_progress_percent(session)
 
-        if session.in_flight_request_kind == "item_create":
-            event_id = (
-                session.in_flight_event_id
-                or _optional_text((session.pending_event or {}).get("eventId"))
-            )
-            item_full_name = _optional_text(
-                (session.in_flight_item_create or {}).get("itemFullName")
+            parsed = parse_qbxml_response(
+                response_xml or "", out=session.in_flight_parsed_response
             )
-            try:
-                if (hresult or "").strip():
-                    error_message = (message or "").strip() or "QuickBooks returned HResult failure."
-                    retryable = not _is_hresult_parse_error(hresult)
-                    if event_id:
-                        self.convex.apply_qb_result(
-                            event_id=event_id,
-                            ticket=session.ticket,
-                            success=False,
-                            qb_txn_type=session.in_flight_txn_type,
-                            qb_error_code=(hresult or "HRESULT_ERROR").strip(),
-                            qb_error_message=error_message,
-                            retryable=retryable,
-                        )
-                    self._clear_pending_event_state(session)
-                    session.last_error = error_message
-                    return self._qbwc_progress_percent()
-
-                parsed = parse_qbxml_response(response_xml or "")
+            if parsed.success or parsed.status_code in _DUPLICATE_NAME_STATUS_CODES:
+                if account_full_name:
+                    self._cache_known_account_name(session, account_full_name)
+                session.last_error = ""
                 if (
-                    parsed.success
-                    or _is_duplicate_name_conflict(parsed.status_code)
+                    session.pending_account_create_queue
+                    or session.pending_item_create_queue
+                    or session.pending_event
                 ):
-                    if item_full_name:
-                        self._cache_created_item_name(item_full_name)
-                    session.last_error = ""
-                    if (
-                        session.pending_account_create_queue
-                        or session.pending_item_create_queue
-                        or session.pending_event
-                    ):
-                        return 0
-                    return self._qbwc_progress_percent()
+                    return 0
+                return self._qbwc_progress_percent(session)
 
-                if (
-                    self.config.qb_accounts_auto_create
-                    and _is_invalid_item_account_reference(
-                        parsed.status_code,
-                        parsed.status_message,
-                    )
-                ):
-                    create_spec = dict(session.in_flight_item_create or {})
-                    missing_account_full_name = _extract_missing_item_account_full_name(
-                        parsed.status_message,
-                    )
-                    missing_account_key = _normalize_account_key(missing_account_full_name)
-                    if (
-                        create_spec
-                        and missing_account_key
-                        and _record_item_account_attempt(create_spec, missing_account_key)
-                    ):
-                        if event_id:
-                            account_specs = self._build_missing_account_create_specs(
-                                session=session,
-                                event_id=event_id,
-                                create_spec=create_spec,
-                                missing_account_full_name=missing_account_full_name,
-                            )
-                            if account_specs:
-                                session.pending_account_create_queue.extend(account_specs)
-                            if account_specs or missing_account_key in session.known_account_keys:
-                                session.pending_item_create_queue.insert(0, create_spec)
-                                session.last_error = ""
-                                return 0
+            if event_id:
+                self._queue_qb_result(
+                    session,
+                    event_id,
+                    success=False,
+                    qb_txn_type=session.in_flight_txn_type,
+                    qb_error_code=parsed.status_code,
+                    qb_error_message=parsed.status_message or "QuickBooks reported an error.",
+                )
+            self._clear_pending_event_state(session)
+            session.last_error = parsed.status_message or "QuickBooks reported an error."
+            return self._qbwc_progress_percent(session)
+        except Exception as exc:
+            if event_id:
+                self._queue_qb_result(
+                    session,
+                    event_id,
+                    success=False,
+                    qb_txn_type=session.in_flight_txn_type,
+                    qb_error_code="ACCOUNT_CREATE_ERROR",
+                    qb_error_message=f"receiveResponseXML account create error: {exc}",
+                    retryable=True,
+                )
+            self._clear_pending_event_state(session)
+            session.last_error = f"receiveResponseXML account create error: {exc}"
+            return self._qbwc_progress_percent(session)
+        finally:
+            self._flush_qb_results(session)
+            self._reset_in_flight_request_state(session)
 
+    def _handle_item_create_response(
+        self,
+        session: SessionState,
+        response_xml: str,
+        clean_hresult: str,
+        hresult_error_message: str,
+    ) -> int:
+        event_id = session.in_flight_event_id or session.pending_event_id or ""
+        item_full_name = _optional_text(
+            (session.in_flight_item_create or _EMPTY_MAPPING).get("itemFullName")
+        )
+        try:
+            if clean_hresult:
+                error_message = hresult_error_message
+                retryable = clean_hresult not in _HRESULT_PARSE_ERROR_CODES
                 if event_id:
-                    self.convex.apply_qb_result(
-                        event_id=event_id,
-                        ticket=session.ticket,
+                    self._queue_qb_result(
+                        session,
+                        event_id,
                         success=False,
                         qb_txn_type=session.in_flight_txn_type,
-                        qb_error_code=parsed.status_code,
-                        qb_error_message=parsed.status_message or "QuickBooks reported an error.",
+                        qb_error_code=clean_hresult,
+                        qb_error_message=error_message,
+                        retryable=retryable,
                     )
                 self._clear_pending_event_state(session)
-                session.last_error = parsed.status_message or "QuickBooks reported an error."
-                return self._qbwc_progress_percent()
-            except Exception as exc:
-                if event_id:
-                    try:
-                        self.convex.apply_qb_result(
+                session.last_error = error_message
+                return self._qbwc_progress_percent(session)
+
+            parsed = parse_qbxml_response(
+                response_xml or "", out=session.in_flight_parsed_response
+            )
+            if parsed.success or parsed.status_code in _DUPLICATE_NAME_STATUS_CODES:
+                if item_full_name:
+                    self._cache_created_item_name(item_full_name)
+                if not session.pending_item_create_queue:
+                    self._flush_qb_items_cache_file()
+                session.last_error = ""
+                if (
+                    session.pending_account_create_queue
+                    or session.pending_item_create_queue
+                    or session.pending_event
+                ):
+                    return 0
+                return self._qbwc_progress_percent(session)
+
+            if (
+                self.config.qb_accounts_auto_create
+                and _is_invalid_item_account_reference(
+                    parsed.status_code,
+                    parsed.status_message,
+                )
+            ):
+                create_spec = dict(session.in_flight_item_create or {})
+                missing_account_full_name = _extract_missing_item_account_full_name(
+                    parsed.status_message,
+                )
+                missing_account_key = _normalize_account_key(missing_account_full_name)
+                if (
+                    create_spec
+                    and missing_account_key
+                    and _record_item_account_attempt(create_spec, missing_account_key)
+                ):
+                    if event_id:
+                        account_specs = self._build_missing_account_create_specs(
+                            session=session,
                             event_id=event_id,
-                            ticket=session.ticket,
-                            success=False,
-                            qb_txn_type=session.in_flight_txn_type,
-                            qb_error_code="ITEM_CREATE_ERROR",
-                            qb_error_message=f"receiveResponseXML item create error: {exc}",
-                            retryable=True,
+                            create_spec=create_spec,
+                            missing_account_full_name=missing_account_full_name,
                         )
-                    except Exception:
-                        pass
-                self._clear_pending_event_state(session)
-                session.last_error = f"receiveResponseXML item create error: {exc}"
-                return self._qbwc_progress_percent()
-            finally:
-                self._reset_in_flight_request_state(session)
+                        if account_specs:
+                            session.pending_account_create_queue.extend(account_specs)
+                        if account_specs or missing_account_key in session.known_account_keys:
+                            session.pending_item_create_queue.insert(0, create_spec)
+                            session.last_error = ""
+                            return 0
 
+            if event_id:
+                self._queue_qb_result(
+                    session,
+                    event_id,
+                    success=False,
+                    qb_txn_type=session.in_flight_txn_type,
+                    qb_error_code=parsed.status_code,
+                    qb_error_message=parsed.status_message or "QuickBooks reported an error.",
+                )
+            self._clear_pending_event_state(session)
+            session.last_error = parsed.status_message or "QuickBooks reported an error."
+            return self._qbwc_progress_percent(session)
+        except Exception as exc:
+            if event_id:
+                self._queue_qb_result(
+                    session,
+                    event_id,
+                    success=False,
+                    qb_txn_type=session.in_flight_txn_type,
+                    qb_error_code="ITEM_CREATE_ERROR",
+                    qb_error_message=f"receiveResponseXML item create error: {exc}",
+                    retryable=True,
+                )
+            self._clear_pending_event_state(session)
+            session.last_error = f"receiveResponseXML item create error: {exc}"
+            return self._qbwc_progress_percent(session)
+        finally:
+            self._flush_qb_results(session)
+            self._reset_in_flight_request_state(session)
+
+    def _handle_event_response(
+        self,
+        session: SessionState,
+        response_xml: str,
+        clean_hresult: str,
+        hresult_error_message: str,
+    ) -> int:
         event_id = session.in_flight_event_id
         if not event_id:
             return 100
 
         try:
-            if (hresult or "").strip():
-                error_message = (message or "").strip() or "QuickBooks returned HResult failure."
-                retryable = not _is_hresult_parse_error(hresult)
-                self.convex.apply_qb_result(
-                    event_id=event_id,
-                    ticket=session.ticket,
+            if clean_hresult:
+                error_message = hresult_error_message
+                retryable = clean_hresult not in _HRESULT_PARSE_ERROR_CODES
+                self._queue_qb_result(
+                    session,
+                    event_id,
                     success=False,
                     qb_txn_type=session.in_flight_txn_type,
-                    qb_error_code=(hresult or "HRESULT_ERROR").strip(),
+                    qb_error_code=clean_hresult,
                     qb_error_message=error_message,
                     retryable=retryable,
                 )
                 session.last_error = error_message
-                return self._qbwc_progress_percent()
+                return self._qbwc_progress_percent(session)
 
-            parsed = parse_qbxml_response(response_xml or "")
+            parsed = parse_qbxml_response(
+                response_xml or "", out=session.in_flight_parsed_response
+            )
             if parsed.success:
-                self.convex.apply_qb_result(
-                    event_id=event_id,
-                    ticket=session.ticket,
+                self._queue_qb_result(
+                    session,
+                    event_id,
                     success=True,
                     qb_txn_id=parsed.txn_id,
                     qb_txn_type=parsed.txn_type or session.in_flight_txn_type,
                 )
                 session.last_error = ""
-                return self._qbwc_progress_percent()
+                return self._qbwc_progress_percent(session)
 
             if (
                 session.in_flight_request_kind == "item_account_sync"
@@ -1842,72 +2480,79 @@ class QbwcService:
                             session.last_error = ""
                             return 0
 
-            self.convex.apply_qb_result(
-                event_id=event_id,
-                ticket=session.ticket,
+            self._queue_qb_result(
+                session,
+                event_id,
                 success=False,
                 qb_txn_type=parsed.txn_type or session.in_flight_txn_type,
                 qb_error_code=parsed.status_code,
                 qb_error_message=parsed.status_message or "QuickBooks reported an error.",
             )
             session.last_error = parsed.status_message or "QuickBooks reported an error."
-            return self._qbwc_progress_percent()
+            return self._qbwc_progress_percent(session)
         except Exception as exc:
             session.last_error = f"receiveResponseXML error: {exc}"
-            return self._qbwc_progress_percent()
+            return self._qbwc_progress_percent(session)
         finally:
-            self._reset_in_flight_request_state(session)
-            pending_event_id = _optional_text((session.pending_event or {}).get("eventId"))
+            self._flush_qb_results(session)
+            pending_event_id = session.pending_event_id
             if (
                 pending_event_id
                 and pending_event_id == event_id
                 and not session.pending_account_create_queue
                 and not session.pending_item_create_queue
             ):
-                self._clear_pending_event_state(session)
+                self._reset_session_for_next_cycle(session)
+            else:
+                self._reset_in_flight_request_state(session)
 
     def get_last_error(self, ticket: str) -> str:
         session = self._session(ticket)
         return session.last_error or "No error recorded."
 
     def close_connection(self, ticket: str) -> str:
-        clean_ticket = (ticket or "").strip()
+        self._flush_qb_items_cache_file()
+        clean_ticket = ticket.strip() if ticket else ""
         if clean_ticket:
             session = self.sessions.pop(clean_ticket, None)
+            if self._last_session is not None and self._last_session[1] is session:
+                self._last_session = None
             if session and session.in_flight_request_kind == "item_query":
                 self._reset_qb_items_query_state()
             if session:
-                self._clear_pending_event_state(session)
-                self._reset_in_flight_request_state(session)
+                self._release_qb_results(session, reason="connection closed")
+                session.local_event_queue.clear()
+                self._reset_session_for_next_cycle(session)
         return "OK"
 
     def connection_error(self, ticket: str, hresult: str, message: str) -> str:
         session = self._session(ticket)
+        error_message = message.strip() if message else "QuickBooks connection error."
         if session.in_flight_request_kind == "item_query":
             self._reset_qb_items_query_state()
             self._reset_in_flight_request_state(session)
-            session.last_error = (message or "QuickBooks connection error.").strip()
+            session.last_error = error_message
             return "done"
 
         event_id = session.in_flight_event_id
         if event_id:
-            try:
-                self.convex.apply_qb_result(
-                    event_id=event_id,
-                    ticket=session.ticket,
-                    success=False,
-                    qb_txn_type=session.in_flight_txn_type,
-                    qb_error_code=(hresult or "CONNECTION_ERROR").strip(),
-                    qb_error_message=(message or "QuickBooks connection error.").strip(),
-                    retryable=True,
-                )
-            finally:
+            self._queue_qb_result(
+                session,
+                event_id,
+                success=False,
+                qb_txn_type=session.in_flight_txn_type,
+                qb_error_code=(hresult.strip() if hresult else "") or "CONNECTION_ERROR",
+                qb_error_message=error_message,
+                retryable=True,
+            )
+            pending_event_id = session.pending_event_id
+            if pending_event_id and pending_event_id == event_id:
+                self._reset_session_for_next_cycle(session)
+            else:
                 self._reset_in_flight_request_state(session)
-                pending_event_id = _optional_text((session.pending_event or {}).get("eventId"))
-                if pending_event_id and pending_event_id == event_id:
-                    self._clear_pending_event_state(session)
 
-        session.last_error = (message or "QuickBooks connection error.").strip()
+        self._flush_qb_results(session, force=True)
+        session.last_error = error_message
         return "done"
 
     def get_interactive_url(self) -> str:
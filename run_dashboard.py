@@ -3,11 +3,37 @@ CEO Dashboard Runner
 Starts the Flask API server and opens the dashboard in the browser
 """
 import os
+import socket
 import sys
+import threading
 import webbrowser
 import time
 from pathlib import Path
 
+try:
+    from waitress import serve
+except ImportError:  # Optional: fall back to the Flask development server.
+    serve = None
+
+DASHBOARD_HOST = "127.0.0.1"
+DASHBOARD_PORT = 5000
+DASHBOARD_URL = f"http://localhost:{DASHBOARD_PORT}"
+
+def _open_when_ready(timeout=30.0, interval=0.2):
+    """Open the dashboard as soon as the server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((DASHBOARD_HOST, DASHBOARD_PORT), interval).close()
+        except OSError:
+            time.sleep(interval)
+            continue
+        webbrowser.open(DASHBOARD_URL)
+        return
+    # Still open it, as the fixed delay used to; the page can be refreshed once up.
+    print(f"Server not reachable after {timeout:.0f}s; opening {DASHBOARD_URL} anyway.")
+    webbrowser.open(DASHBOARD_URL)
+
 def main():
     # Get the project root directory
     project_root = Path(__file__).parent
@@ -16,22 +42,25 @@ def main():
     print("190 Group Analytics - CEO Dashboard")
     print("=" * 60)
     print()
-    print("Starting Flask API server...")
+    print("Starting API server...")
     print("Executive and Inventory dashboards will be available in your browser.")
     print()
     print("Press Ctrl+C to stop the server.")
     print("=" * 60)
     print()
     
-    # Open dashboard in browser after a short delay
-    time.sleep(2)
-    dashboard_url = "http://localhost:5000"
-    webbrowser.open(dashboard_url)
-    
-    # Start Flask server
+    # Start the API server
     sys.path.insert(0, str(project_root / 'api'))
     from dashboard_data import app
-    app.run(debug=True, port=5000, use_reloader=True)
+
+    # Open dashboard in browser once the server is listening; started after the
+    # (slow) app import so the wait only covers binding the port.
+    threading.Thread(target=_open_when_ready, daemon=True).start()
+    if serve is not None:
+        serve(app, host=DASHBOARD_HOST, port=DASHBOARD_PORT, threads=8)
+        return
+    # The reloader would re-run main() in a child process and open a second tab.
+    app.run(host=DASHBOARD_HOST, port=DASHBOARD_PORT, use_reloader=False)
 
 if __name__ == '__main__':
     main()